@@ -0,0 +1,118 @@
+"""Pool of headless Chrome drivers for the pages that still have to be rendered.
+
+A new driver used to be launched for every start URL (and all but the last one were never quit), each one first
+loaded example.com as a self-test, and every page load was followed by a fixed sleep. Here `browsers` drivers
+(from the Actor input) are started on first use and shared by every page of the run: `render()` borrows one,
+loads the page and waits until the given XPath is present, or at most `browser_wait_timeout` seconds, before
+returning the page source. Images, fonts and media are never downloaded. A driver is quit and replaced after
+`browser_pages_per_driver` pages, or as soon as it fails, so a long run does not keep growing Chrome's memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from apify import Actor
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+_BLOCKED_URLS = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.mov', '*.mp3', '*.m4a', '*.ogg',
+]
+
+_browser_context = {
+    "slots": None,
+    "options": {
+        "browsers": 2,
+        "browser_pages_per_driver": 50,
+        "browser_wait_timeout": 20.0,
+    },
+}
+
+
+@asynccontextmanager
+async def browser_pool():
+    """Share the drivers between `render()` calls for as long as the context is open, then quit them all."""
+    actor_input = await Actor.get_input() or {}
+    options = _browser_context["options"]
+    for key in options:
+        if actor_input.get(key) is not None:
+            options[key] = type(options[key])(actor_input[key])
+    slots = asyncio.Queue()
+    # A slot holds None until its driver is first needed.
+    for _ in range(max(1, options["browsers"])):
+        slots.put_nowait(None)
+    _browser_context["slots"] = slots
+    Actor.log.info(f'Rendering pages with up to {options["browsers"]} Chrome drivers.')
+    try:
+        yield
+    finally:
+        _browser_context["slots"] = None
+        while not slots.empty():
+            slot = slots.get_nowait()
+            if slot is not None:
+                await asyncio.to_thread(_quit, slot["driver"])
+
+
+async def render(url: str, wait_xpath: str) -> str:
+    """Load `url` in a pooled driver and return its page source once `wait_xpath` matches."""
+    slots = _browser_context["slots"]
+    options = _browser_context["options"]
+    slot = await slots.get()
+    try:
+        if slot is None:
+            slot = {"driver": await asyncio.to_thread(_start_driver), "pages": 0}
+        page_source = await asyncio.to_thread(_load, slot["driver"], url, wait_xpath, options["browser_wait_timeout"])
+        slot["pages"] += 1
+        if slot["pages"] >= options["browser_pages_per_driver"]:
+            Actor.log.info(f'Recycling a Chrome driver after {slot["pages"]} pages.')
+            await asyncio.to_thread(_quit, slot["driver"])
+            slot = None
+        return page_source
+    except Exception:
+        # The driver may be unusable after a failure; start a fresh one for the next page.
+        if slot is not None:
+            await asyncio.to_thread(_quit, slot["driver"])
+            slot = None
+        raise
+    finally:
+        slots.put_nowait(slot)
+
+
+def _start_driver():
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+    chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    # Return from driver.get() once the DOM is parsed; _load() waits for the content it needs.
+    chrome_options.page_load_strategy = 'eager'
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': _BLOCKED_URLS})
+    Actor.log.info("Chrome WebDriver initialized successfully")
+    return driver
+
+
+def _load(driver, url: str, wait_xpath: str, timeout: float) -> str:
+    driver.get(url)
+    try:
+        WebDriverWait(driver, timeout).until(expected_conditions.presence_of_element_located((By.XPATH, wait_xpath)))
+    except TimeoutException:
+        Actor.log.warning(f'{url} did not render {wait_xpath} within {timeout:g}s, using the page as it is.')
+    return driver.page_source
+
+
+def _quit(driver) -> None:
+    try:
+        driver.quit()
+    except Exception:
+        Actor.log.exception('Cannot quit a Chrome driver.')
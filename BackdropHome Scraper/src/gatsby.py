@@ -0,0 +1,157 @@
+"""Gatsby page-data client for the HTTP-only crawl.
+
+backdrophome.com is a Gatsby site: every page is also published as `/page-data/<path>/page-data.json`, the GraphQL
+result the page is rendered from, and `/page-data/app-data.json` names the build currently deployed. Collection
+pages are listed from their page-data (or, when the product grid is loaded by a static query, from the
+`/page-data/sq/d/<hash>.json` results the page references) and products are read from their own page-data, so
+nothing has to be rendered in a browser.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from urllib.parse import urlsplit
+
+from apify import Actor
+
+from .http_client import fetch
+
+_PRODUCT_PATH = re.compile(r'^(?:https?://[^/]+)?/products/([^/?#]+)/?(?:[?#].*)?$')
+# One absolute image URL, not a srcset.
+_IMAGE_URL = re.compile(r'^(?:https?:)?//\S+\.(?:jpe?g|png|webp|gif)(?:[?#]\S*)?$', re.IGNORECASE)
+
+
+async def gatsby_build(base_url: str) -> str | None:
+    """Return the `webpackCompilationHash` of the deployed build, or None when the site serves no page-data."""
+    app_data = await _get_json(f'{base_url}/page-data/app-data.json')
+    if not app_data:
+        return None
+    return app_data.get('webpackCompilationHash')
+
+
+def page_data_url(url: str) -> str:
+    parts = urlsplit(url)
+    path = parts.path.strip('/') or 'index'
+    return f'{parts.scheme}://{parts.netloc}/page-data/{path}/page-data.json'
+
+
+async def page_data(url: str) -> dict | None:
+    """Return the page-data of the page at `url`, or None when it has none."""
+    return await _get_json(page_data_url(url))
+
+
+async def collection_product_urls(collection_url: str) -> tuple[list[str], str | None] | None:
+    """List the product URLs of a collection page and its title, or None when the page has no page-data."""
+    data = await page_data(collection_url)
+    if data is None:
+        return None
+    parts = urlsplit(collection_url)
+    base_url = f'{parts.scheme}://{parts.netloc}'
+    result = data.get('result') or {}
+    handles = product_handles(result.get('data'))
+    if not handles:
+        # The page query holds no products; the grid is filled by a static query instead.
+        for query_hash in data.get('staticQueryHashes') or []:
+            query = await _get_json(f'{base_url}/page-data/sq/d/{query_hash}.json')
+            handles.extend(handle for handle in product_handles(query) if handle not in handles)
+    return [f'{base_url}/products/{handle}/' for handle in handles], _title(result.get('data'))
+
+
+def product_handles(data) -> list[str]:
+    """Handles of the products referenced anywhere in a GraphQL result, in document order."""
+    handles = []
+
+    def add(handle):
+        if handle and handle not in handles:
+            handles.append(handle)
+
+    def walk(value):
+        if isinstance(value, dict):
+            shopify_id = value.get('shopifyId')
+            if isinstance(value.get('handle'), str) and (
+                    (isinstance(shopify_id, str) and '/Product/' in shopify_id)
+                    or 'productType' in value or 'variants' in value):
+                add(value['handle'])
+            for child in value.values():
+                walk(child)
+        elif isinstance(value, list):
+            for child in value:
+                walk(child)
+        elif isinstance(value, str):
+            match = _PRODUCT_PATH.match(value)
+            if match:
+                add(match.group(1))
+
+    walk(data)
+    return handles
+
+
+def page_data_values(data) -> dict:
+    """Map every labelled value of a GraphQL result to its label, normalized to lowercase letters and digits.
+
+    Both `{"coverage": "..."}` fields and `{"key": "Coverage", "value": "..."}` entries (metafields, spec tables)
+    are collected; the first value found for a label wins.
+    """
+    values = {}
+
+    def add(label, value):
+        if isinstance(label, str) and isinstance(value, str) and value.strip():
+            values.setdefault(re.sub(r'[^a-z0-9]', '', label.lower()), value.strip())
+
+    def walk(value):
+        if isinstance(value, dict):
+            label = next((value[key] for key in ('key', 'name', 'label') if isinstance(value.get(key), str)), None)
+            text = next((value[key] for key in ('value', 'text', 'content') if isinstance(value.get(key), str)), None)
+            if label is not None and text is not None:
+                add(label, text)
+            for key, child in value.items():
+                add(key, child)
+                walk(child)
+        elif isinstance(value, list):
+            for child in value:
+                walk(child)
+
+    walk(data)
+    return values
+
+
+def image_urls(data) -> list[str]:
+    """URLs of the images referenced in a GraphQL result, in document order."""
+    urls = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            for child in value.values():
+                walk(child)
+        elif isinstance(value, list):
+            for child in value:
+                walk(child)
+        elif isinstance(value, str) and _IMAGE_URL.match(value):
+            url = f'https:{value}' if value.startswith('//') else value
+            if url not in urls:
+                urls.append(url)
+
+    walk(data)
+    return urls
+
+
+def _title(data) -> str | None:
+    for value in (data or {}).values():
+        if isinstance(value, dict) and isinstance(value.get('title'), str):
+            return value['title'].strip()
+    return None
+
+
+async def _get_json(url: str):
+    try:
+        response = await fetch(url, follow_redirects=True)
+    except Exception:
+        Actor.log.exception(f'Cannot fetch {url}.')
+        return None
+    if response.status_code != 200:
+        return None
+    try:
+        return json.loads(response.text)
+    except ValueError:
+        return None
@@ -0,0 +1,67 @@
+"""Non-blocking per-host token-bucket rate limiter.
+
+Each host gets a bucket holding up to `burst` tokens that refills at `rate` tokens per second; a request takes one
+token and waits with `asyncio.sleep` (plus a random `jitter` in seconds) when the bucket is empty, so a throttled
+host never blocks work on other hosts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+_rate_context = {
+    "default": {"rate": 5.0, "burst": 5, "jitter": 0.1},
+    "hosts": {},
+    "buckets": {},
+}
+
+
+async def configure_rate_limits(limits: dict | None = None, default: dict | None = None) -> None:
+    """Set per-host limits, e.g. `{"schumacher.com": {"rate": 1, "burst": 2}}`; a host also matches its subdomains.
+
+    A `rate` of 0 leaves the host unthrottled.
+    """
+    if default:
+        _rate_context["default"] = {**_rate_context["default"], **default}
+    for host, settings in (limits or {}).items():
+        _rate_context["hosts"][host.lower()] = settings
+    _rate_context["buckets"].clear()
+
+
+async def acquire(url: str) -> None:
+    """Wait until the host of `url` may receive another request."""
+    bucket = _bucket(urlsplit(url).netloc.lower())
+    if not bucket["rate"]:
+        return
+    async with bucket["lock"]:
+        while True:
+            now = time.monotonic()
+            bucket["tokens"] = min(bucket["burst"], bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+            bucket["updated"] = now
+            if bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                break
+            await asyncio.sleep((1 - bucket["tokens"]) / bucket["rate"] + random.uniform(0, bucket["jitter"]))
+
+
+def _bucket(host: str) -> dict:
+    bucket = _rate_context["buckets"].get(host)
+    if bucket is None:
+        settings = {**_rate_context["default"], **_host_settings(host)}
+        rate = float(settings["rate"] or 0)
+        burst = max(1.0, float(settings["burst"] or 1))
+        bucket = {"rate": rate, "burst": burst, "jitter": float(settings["jitter"] or 0), "tokens": burst,
+                  "updated": time.monotonic(), "lock": asyncio.Lock()}
+        _rate_context["buckets"][host] = bucket
+    return bucket
+
+
+def _host_settings(host: str) -> dict:
+    # The most specific pattern wins, so "api.example.com" can override "example.com".
+    matches = [pattern for pattern in _rate_context["hosts"] if host == pattern or host.endswith('.' + pattern)]
+    if not matches:
+        return {}
+    return _rate_context["hosts"][max(matches, key=len)]
@@ -1,14 +1,24 @@
 from __future__ import annotations
 
-import base64
-from urllib.parse import urljoin
-import gzip
+import asyncio
+from urllib.parse import urlencode, urljoin
 import re
 from apify import Actor
-from httpx import AsyncClient
 import json
 from datetime import datetime
 
+from .dataset import dataset_writer
+from .executor import cpu_pool, run_cpu
+from .http_client import fetch, http_session
+from .incremental import content_fingerprint, incremental_run, product_unchanged
+from .page import encode_raw_text
+from .pipeline import emit, enqueue, product_pipeline
+
+ALGOLIA_INDEX = 'cusa-en-design-palette'
+ALGOLIA_FACETS = ["colorMerged.name", "featuresMerged.name", "designSeries.pricing", "tags", "hierarchicalCategories.lvl0"]
+# The largest page Algolia serves.
+ALGOLIA_HITS_PER_PAGE = 1000
+
 _run_context = {
     "counter": 0  # MUST be an integer, not None
 }
@@ -28,11 +38,10 @@ async def get_timestamp():
 
 
 async def fetch_html(url: str, product_url: str) -> str:
-    async with AsyncClient() as client:
-        Actor.log.info(f"Fetching: {product_url}")
-        response = await client.get(url, follow_redirects=False)
-        if response.status_code == 200:
-            return response.text
+    Actor.log.info(f"Fetching: {product_url}")
+    response = await fetch(url, follow_redirects=False)
+    if response.status_code == 200:
+        return response.text
 
 
 async def main() -> None:
@@ -43,7 +52,14 @@ async def main() -> None:
     the field of web scraping significantly.
     """
     # Enter the context of the Actor.
-    async with Actor:
+    async with (
+        Actor,
+        http_session(cache_store='cambriausa-http-cache'),
+        cpu_pool(),
+        dataset_writer(),
+        incremental_run('cambriausa-incremental'),
+        product_pipeline(process_link_url),
+    ):
         # Retrieve the Actor input, and use default values if not provided.
         actor_input = await Actor.get_input() or {}
         start_urls = actor_input.get('start_urls', [
@@ -53,121 +69,88 @@ async def main() -> None:
             Actor.log.info('No start URLs specified in Actor input, exiting...')
             await Actor.exit()
 
-        # Open the default request queue for handling URLs to be processed.
-
         # Enqueue the start URLs with an initial crawl depth of 0.
-        all_urls = []
         for start_url in start_urls:
-            page = 0
-            while True:
-                async with AsyncClient() as client:
-                    try:
-                        data = '{"requests":[{"indexName":"cusa-en-design-palette","params":"facets=%5B%22colorMerged.name%22%2C%22featuresMerged.name%22%2C%22designSeries.pricing%22%2C%22tags%22%2C%22hierarchicalCategories.lvl0%22%5D&highlightPostTag=__%2Fais-highlight__&highlightPreTag=__ais-highlight__&hitsPerPage=18&maxValuesPerFacet=50&page=' + str(
-                            page) + '&query=&tagFilters="}]}'
-                        response = await client.post(start_url, data=data, follow_redirects=True)
-                        tree = json.loads(response.text)
-                        all_hits = tree['results'][0]['hits']
-                        if not all_hits:
-                            break
-
-                        for hit in all_hits:
-                            page_url = hit['pageurl']
-                            product_url = urljoin('https://www.cambriausa.com/', page_url)
-                            all_urls.append(product_url)
-                        page += 1
-                    except Exception:
-                        Actor.log.exception(f'Cannot extract data from {start_url}.')
-        for link in all_urls:
-            if link.startswith(('http://', 'https://')):
-                await process_link_url(link)
+            try:
+                all_urls = await design_urls(start_url)
+            except Exception:
+                Actor.log.exception(f'Cannot extract data from {start_url}.')
+                continue
+            for link in all_urls:
+                if link.startswith(('http://', 'https://')):
+                    await enqueue(link)
+
+
+async def design_urls(start_url: str) -> list[str]:
+    """List the page URL of every design in the Algolia index.
+
+    The first page tells how many pages there are; the remaining ones are requested together.
+    """
+    first = await algolia_page(start_url, 0)
+    results = [first]
+    if first.get('nbPages', 1) > 1:
+        results += await asyncio.gather(*(algolia_page(start_url, page) for page in range(1, first['nbPages'])))
+    all_urls = []
+    seen = set()
+    for result in results:
+        for hit in result['hits']:
+            product_url = urljoin('https://www.cambriausa.com/', hit['pageurl'])
+            if product_url not in seen:
+                seen.add(product_url)
+                all_urls.append(product_url)
+    Actor.log.info(f'Found {len(all_urls)} designs in {len(results)} Algolia pages.')
+    return all_urls
+
+
+async def algolia_page(start_url: str, page: int) -> dict:
+    params = {
+        'hitsPerPage': ALGOLIA_HITS_PER_PAGE,
+        'page': page,
+        'query': '',
+        'attributesToRetrieve': json.dumps(['pageurl']),
+        'attributesToHighlight': '[]',
+    }
+    # Facet counts do not depend on the page; compute them once.
+    if page == 0:
+        params['facets'] = json.dumps(ALGOLIA_FACETS)
+        params['maxValuesPerFacet'] = 50
+    data = json.dumps({"requests": [{"indexName": ALGOLIA_INDEX, "params": urlencode(params)}]})
+    response = await fetch(start_url, 'POST', data=data, follow_redirects=True)
+    return json.loads(response.text)['results'][0]
 
 
 async def process_link_url(product_url: str):
     updated_url = f'https://www.cambriausa.com/graphql/execute.json/cusa/design-by-slug;slug={product_url.split("/")[-1]}'
     response_product = await fetch_html(updated_url, product_url)
-    compressed = gzip.compress(response_product.encode('utf-8'))
-    raw_text = base64.b64encode(compressed).decode('utf-8')
-    json_data = json.loads(response_product)
-    name = json_data['data']['designList']['items'][0]['designName']
-    cleaned_name = re.sub(r'[^a-zA-Z0-9\s]', '', name)
-    description = json_data['data']['designList']['items'][0]['description']['html']
-    cleaned_description = re.sub(r'<[^>]+>', '', description)
-    images = []
-    img_no_one = json_data['data']['designList']['items'][0]['fullSlabImage']['_path']
-    full_img_one_url = urljoin('https://www.cambriausa.com/', img_no_one)
-    images.append(full_img_one_url)
-    img_no_two = json_data['data']['designList']['items'][0]['slabDetailImage']['_path']
-    full_img_two_url = urljoin('https://www.cambriausa.com/', img_no_two)
-    images.append(full_img_two_url)
-    images_link = json_data['data']['designList']['items'][0]['inspirationVideoAndImages']
-    for img in images_link:
-        img_link = img['_path']
-        if '.jpg' in img_link:
-            img_url = urljoin('https://www.cambriausa.com/', img_link)
-            images.append(img_url)
-    new_specification_pdf_path = None
-    try:
-        specification_pdf_path = json_data['data']['designList']['items'][0]['tearSheet']['_path']
-    except:
-        specification_pdf_path = None
-    if specification_pdf_path:
-        new_specification_pdf_path = urljoin('https://www.cambriausa.com/', specification_pdf_path)
-    new_cad_bim_pdf = None
-    try:
-        cad_bim_pdf = f"{json_data['data']['designList']['items'][0]['cadbim']['_path']}.html"
-    except:
-        cad_bim_pdf = None
-    if cad_bim_pdf:
-        new_cad_bim_pdf = urljoin('https://www.cambriausa.com/', cad_bim_pdf)
-    documents = [
-        {'title': "Specifications (PDF)", 'url': new_specification_pdf_path, 'type': "spec_sheet"},
-        {"title": "CAD/BIM files", "url": new_cad_bim_pdf, "type": "cad_bim"},
-        {"title": "Slab image", "url": full_img_one_url, "type": "image"},
-        {"title": "Detail image", "url": full_img_two_url, "type": "image"}
-    ]
-    collection = f"{json_data['data']['designList']['items'][0]['designSeries']['name']} Series"
-    variantGroup = product_url.split("/")[-1]
-    thickness_list = json_data['data']['designList']['items'][0]['thickness']
-    finish_list = json_data['data']['designList']['items'][0]['finishes']
-    width_length_data = json_data['data']['designList']['items'][0]['slabSize']['name'].split('(')[0]
-    width = float(width_length_data.split('x')[0].replace('in', '').strip())
-    length = float(width_length_data.split('x')[1].replace('in', '').strip())
-    care = json_data['data']['designList']['items'][0]['productCareCopy'][0]['productCareDescription']['html']
-    cleaned_care = re.sub(r'<[^>]+>', '', care)
-    new_thickness_value = 0
-    for finish in finish_list:
-        finish_name = finish['name']
-        cleaned__finish_name = re.sub(r'[^a-zA-Z0-9\s]', '', finish_name)
-        updated_finish_name = cleaned__finish_name.split()[-1]
-        for thick in thickness_list:
-            thickness_value = thick['name']
-            match = re.search(r'\d+', thickness_value)
-            if match:
-                new_thickness_value = int(match.group())
-            thickness = round(await cm_to_inches(new_thickness_value), 2)
-            dimensions = {"width": width, "length": length, "thickness": thickness, "units": "in"}
+    if await product_unchanged(product_url, content_fingerprint(response_product)):
+        return
+    raw_text = await run_cpu(encode_raw_text, response_product)
+    design = await extract_design(json.loads(response_product), product_url)
+    for cleaned__finish_name, updated_finish_name in design['finishes']:
+        for thickness_value, thickness in design['thicknesses']:
+            dimensions = {"width": design['width'], "length": design['length'], "thickness": thickness, "units": "in"}
             specifications = {
                 "dimensions": dimensions,
                 "composition": [],
                 "pattern": None,
                 "application": None,
                 "performance": None,
-                "care": cleaned_care
+                "care": design['care']
             }
             additionalData = {
                 "priceUnit": None,
                 "raw_text": raw_text
             }
-            full_name = f"{cleaned_name} — {cleaned__finish_name} ({thickness_value}, {width_length_data})".strip()
-            Id = f'cambria-{cleaned_name.replace(" ", "-").lower()}-{updated_finish_name.lower().strip()}-{thickness_value.replace(" ", "-")}'.lower()
+            full_name = f"{design['name']} — {cleaned__finish_name} ({thickness_value}, {design['size']})".strip()
+            Id = f'cambria-{design["name"].replace(" ", "-").lower()}-{updated_finish_name.lower().strip()}-{thickness_value.replace(" ", "-")}'.lower()
             item = {
                 "id": Id,
                 "name": full_name,
                 "vendor": "Cambria",
                 "category": "Stone Slabs",
                 "subcategory": "Engineered Stone / Quartz",
-                "description": cleaned_description,
-                "imageUrl": images,
+                "description": design['description'],
+                "imageUrl": design['images'],
                 "url": product_url,
                 "material": "Quartz",
                 "useCase": None,
@@ -175,10 +158,10 @@ async def process_link_url(product_url: str):
                 "price": None,
                 "sustainability": None,
                 "certifications": [],
-                "documents": documents,
+                "documents": design['documents'],
                 "location": None,
-                "collection": collection,
-                "variantGroup": variantGroup,
+                "collection": design['collection'],
+                "variantGroup": design['variantGroup'],
                 "storedImagePath": None,
                 "color": None,
                 "finish": updated_finish_name.lower(),
@@ -192,7 +175,79 @@ async def process_link_url(product_url: str):
                 "specifications": specifications,
                 "additionalData": additionalData
             }
-            await Actor.push_data(item)
+            await emit(item)
+
+
+async def extract_design(json_data: dict, product_url: str) -> dict:
+    """Read everything the finish × thickness variants share from a design-by-slug response, once per design."""
+    design = json_data['data']['designList']['items'][0]
+    name = design['designName']
+    cleaned_name = re.sub(r'[^a-zA-Z0-9\s]', '', name)
+    description = design['description']['html']
+    cleaned_description = re.sub(r'<[^>]+>', '', description)
+    images = []
+    img_no_one = design['fullSlabImage']['_path']
+    full_img_one_url = urljoin('https://www.cambriausa.com/', img_no_one)
+    images.append(full_img_one_url)
+    img_no_two = design['slabDetailImage']['_path']
+    full_img_two_url = urljoin('https://www.cambriausa.com/', img_no_two)
+    images.append(full_img_two_url)
+    images_link = design['inspirationVideoAndImages']
+    for img in images_link:
+        img_link = img['_path']
+        if '.jpg' in img_link:
+            img_url = urljoin('https://www.cambriausa.com/', img_link)
+            images.append(img_url)
+    new_specification_pdf_path = None
+    try:
+        specification_pdf_path = design['tearSheet']['_path']
+    except:
+        specification_pdf_path = None
+    if specification_pdf_path:
+        new_specification_pdf_path = urljoin('https://www.cambriausa.com/', specification_pdf_path)
+    new_cad_bim_pdf = None
+    try:
+        cad_bim_pdf = f"{design['cadbim']['_path']}.html"
+    except:
+        cad_bim_pdf = None
+    if cad_bim_pdf:
+        new_cad_bim_pdf = urljoin('https://www.cambriausa.com/', cad_bim_pdf)
+    documents = [
+        {'title': "Specifications (PDF)", 'url': new_specification_pdf_path, 'type': "spec_sheet"},
+        {"title": "CAD/BIM files", "url": new_cad_bim_pdf, "type": "cad_bim"},
+        {"title": "Slab image", "url": full_img_one_url, "type": "image"},
+        {"title": "Detail image", "url": full_img_two_url, "type": "image"}
+    ]
+    width_length_data = design['slabSize']['name'].split('(')[0]
+    care = design['productCareCopy'][0]['productCareDescription']['html']
+    finishes = []
+    for finish in design['finishes']:
+        finish_name = finish['name']
+        cleaned__finish_name = re.sub(r'[^a-zA-Z0-9\s]', '', finish_name)
+        finishes.append((cleaned__finish_name, cleaned__finish_name.split()[-1]))
+    thicknesses = []
+    new_thickness_value = 0
+    for thick in design['thickness']:
+        thickness_value = thick['name']
+        # A thickness without a number keeps the value of the one before it.
+        match = re.search(r'\d+', thickness_value)
+        if match:
+            new_thickness_value = int(match.group())
+        thicknesses.append((thickness_value, round(await cm_to_inches(new_thickness_value), 2)))
+    return {
+        "name": cleaned_name,
+        "description": cleaned_description,
+        "images": images,
+        "documents": documents,
+        "collection": f"{design['designSeries']['name']} Series",
+        "variantGroup": product_url.split("/")[-1],
+        "size": width_length_data,
+        "width": float(width_length_data.split('x')[0].replace('in', '').strip()),
+        "length": float(width_length_data.split('x')[1].replace('in', '').strip()),
+        "care": re.sub(r'<[^>]+>', '', care),
+        "finishes": finishes,
+        "thicknesses": thicknesses,
+    }
 
 
 async def cm_to_inches(cm):
@@ -7,24 +7,30 @@ https://docs.apify.com/sdk/python
 """
 
 from __future__ import annotations
-import time
 from urllib.parse import urljoin
 from lxml import html
-from bs4 import BeautifulSoup
-import gzip
-import base64
 from datetime import datetime
 from apify import Actor
-from httpx import AsyncClient
-import json
+
+from .dataset import dataset_writer
+from .executor import cpu_pool, run_cpu
+from .http_client import fetch, http_session
+from .incremental import content_fingerprint, incremental_run, product_unchanged
+from .page import encode_raw_text, page_text, parse_page
+from .pipeline import emit, enqueue, product_pipeline
+from .product_json import product_json_for_url
+from .shopify import collection_products, product_description, product_fingerprint, shopify_product_url
+
+POLITE_RATE_LIMITS = {
+    "chasingpaper.com": {"rate": 2, "burst": 2, "jitter": 0.25},
+}
 
 
 async def fetch_html(url: str) -> str:
-    async with AsyncClient() as client:
-        Actor.log.info(f"Fetching: {url}")
-        response = await client.get(url, follow_redirects=False)
-        if response.status_code == 200:
-            return response.text
+    Actor.log.info(f"Fetching: {url}")
+    response = await fetch(url, follow_redirects=False)
+    if response.status_code == 200:
+        return response.text
 
 
 async def main() -> None:
@@ -35,7 +41,14 @@ async def main() -> None:
     the field of web scraping significantly.
     """
     # Enter the context of the Actor.
-    async with Actor:
+    async with (
+        Actor,
+        http_session(rate_limits=POLITE_RATE_LIMITS, cache_store='chasingpaper-http-cache'),
+        cpu_pool(),
+        dataset_writer(),
+        incremental_run('chasingpaper-incremental'),
+        product_pipeline(process_link_url),
+    ):
         # Retrieve the Actor input, and use default values if not provided.
         actor_input = await Actor.get_input() or {}
         start_urls = actor_input.get("url", [
@@ -54,33 +67,36 @@ async def main() -> None:
                 subcategory = "Wallpaper"
             if 'murals' in start_url:
                 subcategory = "Murals"
+            products = await collection_products(start_url)
+            if products is not None:
+                for product in products:
+                    await enqueue(shopify_product_url(start_url, product), subcategory, product)
+                continue
             page = 2
             while True:
-                # Create an HTTPX client to fetch the HTML content of the URLs.
-                async with AsyncClient() as client:
-                    try:
-                        # Fetch the HTTP response from the specified URL using HTTPX.
-                        response = await client.get(start_url, follow_redirects=True)
+                try:
+                    # Fetch the HTTP response from the specified URL using HTTPX.
+                    response = await fetch(start_url, follow_redirects=True)
 
-                        tree = html.fromstring(response.text)
+                    tree = html.fromstring(response.text)
 
-                        all_links = tree.xpath('//article//a[@class="link-wrapper"]/@href')
-                        if not all_links:
-                            break
-                        for link in all_links:
-                            link_url = urljoin('https://chasingpaper.com', link)
+                    all_links = tree.xpath('//article//a[@class="link-wrapper"]/@href')
+                    if not all_links:
+                        break
+                    for link in all_links:
+                        link_url = urljoin('https://chasingpaper.com', link)
 
-                            if link_url.startswith(('http://', 'https://')):
-                                await process_link_url(link_url, subcategory)
-                        next_page_url = ''.join(
-                            tree.xpath(f'//nav[@class="pagination"]/ul/li/a[@aria-label="Page {page}"]/@href')).strip()
-                        if not next_page_url:
-                            break
-                        start_url = urljoin('https://chasingpaper.com', next_page_url)
-                        page += 1
+                        if link_url.startswith(('http://', 'https://')):
+                            await enqueue(link_url, subcategory)
+                    next_page_url = ''.join(
+                        tree.xpath(f'//nav[@class="pagination"]/ul/li/a[@aria-label="Page {page}"]/@href')).strip()
+                    if not next_page_url:
+                        break
+                    start_url = urljoin('https://chasingpaper.com', next_page_url)
+                    page += 1
 
-                    except Exception:
-                        Actor.log.exception(f'Cannot extract data from {start_url}.')
+                except Exception:
+                    Actor.log.exception(f'Cannot extract data from {start_url}.')
 
 
 _run_context = {
@@ -101,42 +117,18 @@ async def generate_source_run_id():
     return f"run-chasingpaper-{_run_context['counter']:03d}"
 
 
-async def process_link_url(product_url: str, subcategory: str):
-    time.sleep(1)
-    content_html = await fetch_html(product_url)
-    if not content_html:
-        Actor.log.info(f"Response Not Found: {product_url}")
-        return
-    soup = BeautifulSoup(content_html, 'html.parser')
-    visible_text = soup.get_text(strip=True)
-    compressed = gzip.compress(visible_text.encode('utf-8'))
-    raw_text = base64.b64encode(compressed).decode('utf-8')
-    tree = html.fromstring(content_html)
-    description = ''.join(tree.xpath('//div[@class="product-description__content"]/p//text()')).strip().replace(' ',
-                                                                                                                ' ', ).replace(
-        '\n', ' ').strip()
-    if not description:
-        description = ''.join(
-            tree.xpath('//*[contains(text(),"Details")]/following-sibling::span/text()')).strip().replace(' ',
-                                                                                                          ' ', ).replace(
-            '\n', ' ').strip()
-    if not description:
-        description = ''.join(tree.xpath('//meta[@property="og:description"]/@content')).strip().replace(' ',
-                                                                                                         ' ', ).replace(
-            '\n', ' ').strip()
-    if not description:
-        description = None
+def page_fields(tree) -> dict:
+    """Read what products.json does not have: the Specs list of the product page.
+
+    That is the vertical repeat, every size on offer, and the finish and certified ink of the "Printed with" line.
+    """
+    specs = tree.xpath('//*[contains(text(),"Specs")]/following-sibling::ul/li//text()')
     try:
-        repeatVertical = float(
-            ''.join(tree.xpath('//*[contains(text(),"Specs")]/following-sibling::ul/li//text()')).strip().split(
-                '”')[
-                0].strip().split('"')[0].strip())
+        repeatVertical = float(''.join(specs).strip().split('”')[0].strip().split('"')[0].strip())
     except:
         repeatVertical = None
-    all_sizes = ''.join(tree.xpath('//*[contains(text(),"Specs")]/following-sibling::ul/li[1]//text()')).strip()
-    all_text = tree.xpath('//*[contains(text(),"Specs")]/following-sibling::ul/li//text()')
     try:
-        printed_strings = [s for s in all_text if s.startswith("Printed with")][0].split('.')
+        printed_strings = [s for s in specs if s.startswith("Printed with")][0].split('.')
     except:
         printed_strings = []
     finish = None
@@ -150,19 +142,50 @@ async def process_link_url(product_url: str, subcategory: str):
             certification = printed_string.replace('Printed with', '').replace('Certified Ink', '').strip()
             if certification:
                 certifications.append(certification)
+    return {
+        "repeatVertical": repeatVertical,
+        "all_sizes": ''.join(tree.xpath('//*[contains(text(),"Specs")]/following-sibling::ul/li[1]//text()')).strip(),
+        "finish": finish,
+        "certifications": certifications,
+        "sustainability": sustainability,
+    }
 
-    try:
-        variant_json_string = \
-            ''.join(tree.xpath('//script[@id="web-pixels-manager-setup"]/text()')).strip().split('productVariants":')[
-                1].split(
-                '],')[0].strip() + ']'
-    except:
-        variant_json_string = None
-    variants = json.loads(variant_json_string)
+
+async def process_link_url(product_url: str, subcategory: str, product: dict | None = None):
+    if product is not None and await product_unchanged(product_url, product_fingerprint(product)):
+        return
+    content_html = await fetch_html(product_url)
+    if not content_html:
+        Actor.log.info(f"Response Not Found: {product_url}")
+        return
+    tree = await run_cpu(parse_page, content_html)
+    visible_text = await run_cpu(page_text, tree)
+    if product is None and await product_unchanged(product_url, content_fingerprint(visible_text)):
+        return
+    raw_text = await run_cpu(encode_raw_text, visible_text)
+    if product is None:
+        # Listed from the collection pages: the title, variants, images and description come from the product's JSON.
+        product = await product_json_for_url(product_url)
+        if product is None:
+            Actor.log.info(f"Product JSON Not Found: {product_url}")
+            return
+    fields = await run_cpu(page_fields, tree)
+    description = (product_description(product) or '').replace('\xa0', ' ').replace('\n', ' ').strip()
+    if not description:
+        description = None
+    repeatVertical = fields['repeatVertical']
+    all_sizes = fields['all_sizes']
+    finish = fields['finish']
+    certifications = fields['certifications']
+    sustainability = fields['sustainability']
+    images_by_variant = {variant_id: image['src'] for image in product.get('images') or []
+                         for variant_id in image.get('variant_ids') or []}
+    title_name = product['title']
+    variants = product['variants']
     for variant in variants:
         variant_id = variant['id']
         variant_name = variant['title'].split('--')[0].strip()
-        variant_price = variant['price']['amount']
+        variant_price = float(variant['price'])
         Color = '-'.join(variant_name.split('/')[2:]).strip()
         tags = variant_name.split('/')[0].strip()
         dimensions = variant_name.split('/')[1].strip()
@@ -171,14 +194,12 @@ async def process_link_url(product_url: str, subcategory: str):
             'ft', '').replace('in', '').replace('high', '').replace('wide', '').strip().replace(' x ', 'x').replace(' ',
                                                                                                                     '-') + '-' + Color.lower()
         Id = f"chasingpaper-{product_url.split('/')[-1].strip()}-{variant_id_name}".replace(' x', 'x').replace('-x', 'x')
-        title_name = variant['product']['title']
         name = f"{title_name} {tags} {subcategory} - {Color} ({dimensions})"
         variantGroup = title_name.strip().replace(' ', '-').lower()
         Images = []
-        images = variant['image']['src']
-        if 'https:' not in images:
-            images = 'https:' + images
-            Images.append(images)
+        images = (variant.get('featured_image') or {}).get('src') or images_by_variant.get(variant_id)
+        if images:
+            Images.append(images if images.startswith('https:') else 'https:' + images)
         url = product_url + f'?variant={variant_id}'
         if 'ft' in dimensions:
             width = float(dimensions.replace('Sample', '').strip().split('x')[0].strip().split('ft')[0].strip())
@@ -249,4 +270,4 @@ async def process_link_url(product_url: str, subcategory: str):
                 "wasManuallyEdited": False,
                 "specifications": specifications,
                 "additionalData": additionalData}
-        await Actor.push_data([item])
\ No newline at end of file
+        await emit([item])
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""Bounded-concurrency pipeline for the product detail handlers.
+
+Listing code enqueues the arguments of one handler call per product and a fixed pool of workers runs the handler
+(fetch, parse, push) for up to `max_concurrency` products at a time. A failing product is logged and skipped
+without stopping the run. Handlers push their items through `emit()`, which hands them to the buffered dataset
+writer and keeps the dataset in submission order when `ordered_output` is set in the Actor input.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+from apify import Actor
+
+from .dataset import push_items
+from .incremental import product_scope, track_item
+
+_pipeline_context = {
+    "queue": None,
+    "handler": None,
+    "ordered": False,
+    "max_per_host": None,
+    "host_slots": {},
+    "submitted": 0,
+    "next_to_emit": 0,
+    "buffers": {},
+    "finished": set(),
+}
+
+_current_index = ContextVar("_current_index", default=None)
+
+
+@asynccontextmanager
+async def product_pipeline(handler):
+    """Run `handler` on a pool of workers for as long as the context is open, then drain the queue."""
+    actor_input = await Actor.get_input() or {}
+    concurrency = max(1, int(actor_input.get("max_concurrency", 10)))
+    _pipeline_context.update({
+        "queue": asyncio.Queue(maxsize=concurrency * 2),
+        "handler": handler,
+        "ordered": bool(actor_input.get("ordered_output", False)),
+        "max_per_host": actor_input.get("max_concurrency_per_host"),
+    })
+    workers = [asyncio.create_task(_worker()) for _ in range(concurrency)]
+    try:
+        yield
+        await join_pipeline()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def enqueue(*args) -> None:
+    """Schedule one handler call; waits while the queue is full so listing cannot run far ahead of the workers."""
+    index = _pipeline_context["submitted"]
+    _pipeline_context["submitted"] += 1
+    if _pipeline_context["ordered"]:
+        _pipeline_context["buffers"][index] = []
+    await _pipeline_context["queue"].put((index, args))
+
+
+async def join_pipeline() -> None:
+    """Wait until every enqueued product has been handled."""
+    await _pipeline_context["queue"].join()
+
+
+async def emit(item) -> None:
+    """Push a dataset item (or a list of items) produced by a handler."""
+    track_item(item)
+    index = _current_index.get()
+    buffer = _pipeline_context["buffers"].get(index)
+    if buffer is not None:
+        buffer.extend(item if isinstance(item, list) else [item])
+        return
+    await push_items(item)
+
+
+async def _worker() -> None:
+    queue = _pipeline_context["queue"]
+    while True:
+        index, args = await queue.get()
+        token = _current_index.set(index)
+        url = _task_url(args)
+        try:
+            async with _host_slot(url), product_scope():
+                await _pipeline_context["handler"](*args)
+        except Exception:
+            Actor.log.exception(f'Cannot extract data from {url}.')
+        finally:
+            _current_index.reset(token)
+            if _pipeline_context["ordered"]:
+                await _finish(index)
+            queue.task_done()
+
+
+async def _finish(index: int) -> None:
+    # Release buffered items only once every earlier product has been released.
+    _pipeline_context["finished"].add(index)
+    while _pipeline_context["next_to_emit"] in _pipeline_context["finished"]:
+        next_index = _pipeline_context["next_to_emit"]
+        _pipeline_context["finished"].discard(next_index)
+        items = _pipeline_context["buffers"].pop(next_index)
+        if items:
+            await push_items(items)
+        _pipeline_context["next_to_emit"] += 1
+
+
+def _task_url(args) -> str | None:
+    return next((arg for arg in args if isinstance(arg, str) and arg.startswith(('http://', 'https://'))), None)
+
+
+def _host_slot(url: str | None):
+    max_per_host = _pipeline_context["max_per_host"]
+    if not max_per_host or not url:
+        return _no_slot()
+    host = urlsplit(url).netloc.lower()
+    slots = _pipeline_context["host_slots"]
+    if host not in slots:
+        slots[host] = asyncio.Semaphore(int(max_per_host))
+    return slots[host]
+
+
+@asynccontextmanager
+async def _no_slot():
+    yield
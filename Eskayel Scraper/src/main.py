@@ -7,17 +7,21 @@ https://docs.apify.com/sdk/python
 """
 
 from __future__ import annotations
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 from lxml import html
 import re
-from bs4 import BeautifulSoup
-import gzip
-import base64
 from apify import Actor
-from httpx import AsyncClient
-import json
 from datetime import datetime
 
+from .dataset import dataset_writer
+from .executor import cpu_pool, run_cpu
+from .http_client import fetch, http_session
+from .incremental import content_fingerprint, incremental_run, product_unchanged
+from .page import encode_raw_text, page_text, parse_page
+from .pipeline import emit, enqueue, product_pipeline
+from .product_json import product_json_for_url
+from .shopify import collection_products, product_description, product_fingerprint, shopify_product_url
+
 _run_context = {
     "counter": 0  # MUST be an integer, not None
 }
@@ -37,11 +41,39 @@ async def generate_source_run_id():
 
 
 async def fetch_html(url: str) -> str:
-    async with AsyncClient() as client:
-        Actor.log.info(f"Fetching: {url}")
-        response = await client.get(url, follow_redirects=False)
-        if response.status_code == 200:
-            return response.text
+    Actor.log.info(f"Fetching: {url}")
+    response = await fetch(url, follow_redirects=False)
+    if response.status_code == 200:
+        return response.text
+
+
+def page_fields(tree) -> dict:
+    """Read what products.json does not have, once per product rather than once per variant.
+
+    That is the name line and full title, the lead time, the pattern type and repeats in the quote block, the specs
+    and material lines, care, sustainability, and the gallery images and wallpaper price shown on the page. The
+    description block is read as well, for products whose JSON has no `body_html`.
+    """
+    description = ''.join(tree.xpath("//h3[text()='Description']/following-sibling::p//text()")).strip()
+    if not description:
+        description = ''.join(tree.xpath("//h3[text()='Description']/following-sibling::span/text()"))
+    images = tree.xpath(
+        '//div[@class="product__media media media--transparent gradient global-media-settings"]/img/@src')
+    return {
+        "name": ''.join(tree.xpath('//div[@class="product__title"]/h1/text()')),
+        "full_title": ''.join(tree.xpath('//div[@class="product__title"]/h1//text()')),
+        "description": description,
+        "images": ['http:' + img if img.startswith('//') else img for img in images],
+        "lead_time": ''.join(tree.xpath('//div[@class="product_quote"]/preceding-sibling::p/text()')),
+        "product_quote": ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')),
+        "specs": ''.join(tree.xpath("//h3[text()='Specs']/following-sibling::p/text()")).strip(),
+        "material_line": ''.join(tree.xpath("//p[contains(text(),'MATERIAL')]/text()[3]")),
+        "care": ''.join(tree.xpath(
+            "//h3[contains(text(),' Care')]/parent::summary/following-sibling::div/p/text()")).strip(),
+        "sustainability": ''.join(tree.xpath(
+            "//h3[contains(text(),' Sustainability')]/parent::summary/following-sibling::div/p/text()")).strip(),
+        "price": ''.join(tree.xpath('//span[@class="price-item price-item--regular"]/text()')),
+    }
 
 
 async def main() -> None:
@@ -51,7 +83,14 @@ async def main() -> None:
     Asynchronous execution is required for communication with Apify platform, and it also enhances performance in
     the field of web scraping significantly.
     """
-    async with Actor:
+    async with (
+        Actor,
+        http_session(cache_store='eskayel-http-cache'),
+        cpu_pool(),
+        dataset_writer(),
+        incremental_run('eskayel-incremental'),
+        product_pipeline(process_link_url),
+    ):
         # Retrieve the Actor input, and use default values if not provided.
         actor_input = await Actor.get_input() or {}
         start_urls = actor_input.get('start_urls', [
@@ -67,63 +106,115 @@ async def main() -> None:
 
         # Enqueue the start URLs with an initial crawl depth of 0.
         for start_url in start_urls:
+            products = await collection_products(start_url)
+            if products is not None:
+                for product in products:
+                    link_url = shopify_product_url(start_url, product)
+                    await enqueue(link_url, urlsplit(link_url).path, product)
+                continue
 
             All_Link = []
             page = 1
             while True:
                 updated_start_url = f'{start_url}?page={page}'
-                async with AsyncClient() as client:
-                    try:
+                try:
 
-                        # Fetch the HTTP response from the specified URL using HTTPX.
-                        response = await client.get(updated_start_url, follow_redirects=True)
+                    # Fetch the HTTP response from the specified URL using HTTPX.
+                    response = await fetch(updated_start_url, follow_redirects=True)
 
-                        tree = html.fromstring(response.text)
+                    tree = html.fromstring(response.text)
 
-                        all_links = tree.xpath('//a[contains(@href,"/products")]/@href')
-                        if not all_links:
-                            break
-                        for link in all_links:
-                            if 'products' in link:
-                                if link in All_Link:
-                                    continue
-                                All_Link.append(link)
-                                link_url = urljoin('https://eskayel.com', link)
-                                if link_url.startswith(('http://', 'https://')):
-                                    await process_link_url(link_url, link)
-                        page += 1
+                    all_links = tree.xpath('//a[contains(@href,"/products")]/@href')
+                    if not all_links:
+                        break
+                    for link in all_links:
+                        if 'products' in link:
+                            if link in All_Link:
+                                continue
+                            All_Link.append(link)
+                            link_url = urljoin('https://eskayel.com', link)
+                            if link_url.startswith(('http://', 'https://')):
+                                await enqueue(link_url, link)
+                    page += 1
 
-                    except Exception:
-                        Actor.log.exception(f'Cannot extract data from {start_url}.')
+                except Exception:
+                    Actor.log.exception(f'Cannot extract data from {start_url}.')
 
 
-async def process_link_url(product_url: str, link: str):
+async def process_link_url(product_url: str, link: str, product: dict | None = None):
+    if product is not None and await product_unchanged(product_url, product_fingerprint(product)):
+        return
     content_html = await fetch_html(product_url)
-    soup = BeautifulSoup(content_html, 'html.parser')
-    visible_text = soup.get_text(strip=True)
-    compressed = gzip.compress(visible_text.encode('utf-8'))
-    raw_text = base64.b64encode(compressed).decode('utf-8')
-    tree = html.fromstring(content_html)
+    tree = await run_cpu(parse_page, content_html)
+    visible_text = await run_cpu(page_text, tree)
+    if product is None and await product_unchanged(product_url, content_fingerprint(visible_text)):
+        return
+    raw_text = await run_cpu(encode_raw_text, visible_text)
+    if product is None:
+        # Listed from the collection pages: the title, variants and description come from the product's JSON.
+        product = await product_json_for_url(product_url)
+        if product is None:
+            Actor.log.info(f"Product JSON Not Found: {product_url}")
+            return
+    fields = await run_cpu(page_fields, tree)
+
+    data_for_color_and_variant_group = product['title']
+    variant_data = product['variants']
+    variantGroup = data_for_color_and_variant_group.split('||')[0].lower().replace(' ', '-')
+    color = data_for_color_and_variant_group.split('||')[1].lower().strip()
+    Id_part = data_for_color_and_variant_group.strip().replace('||', '-').replace(' ', '-').lower()
+    images = fields['images']
+    description = product_description(product) or fields['description']
+    product_type = fields['product_quote'].strip()
+    care = fields['care']
 
     if 'fabric' in link:
-        variant_listing = f"{product_url}/products.json"
-        json_response = await fetch_html(variant_listing)
-
-        variant_json = json.loads(json_response)
-        data_for_color_and_variant_group = variant_json['product']['title']
-        variant_data = variant_json['product']['variants']
+        name = fields['name']
+        lead_time = fields['lead_time'].split(":")[-1].strip()
+        collection = name.split()[0].lower()
+        match = re.search(r'FABRIC WIDTH:\s*([\d.]+[″"]?)', fields['specs'])
+        fabric_width = None
+        if match:
+            fabric_width = match.group(1)
+        try:
+            width = float(fabric_width)
+        except:
+            width = ''
+        if not width:
+            width = None
+        try:
+            length = float(
+                fields['material_line'].split(':')[1].split('(')[0].strip().split('x')[1].replace("'", '').strip()) * 12
+        except:
+            length = ''
+        if not length:
+            length = None
+        match = re.search(r'\bhalf[-\s]?drop\b', product_type, re.IGNORECASE)
+        if match:
+            match = match.group()
+        try:
+            pattern_vertical = float(fields['product_quote'].split('Vertical Repeat:')[1].split('"')[0].split('”')[0])
+        except:
+            pattern_vertical = ''
+        if not pattern_vertical:
+            pattern_vertical = None
+        try:
+            pattern_horizontal = float(
+                fields['product_quote'].split('Horizontal Repeat:')[1].replace('"', '').split('”')[0])
+        except:
+            pattern_horizontal = ''
+        if not pattern_horizontal:
+            try:
+                pattern_horizontal = float(
+                    fields['product_quote'].split(':')[1].split('/')[0].split()[-1].replace('"', ''))
+            except:
+                pattern_horizontal = ''
+        if not pattern_horizontal:
+            pattern_horizontal = None
+        sustainability = fields['sustainability']
         for id_ in variant_data:
             fabric_id = id_['id']
             url = product_url + f'?variant={fabric_id}'
-            name = ''.join(tree.xpath('//div[@class="product__title"]/h1/text()'))
-            description = ''.join(
-                tree.xpath("//h3[text()='Description']/following-sibling::p//text()")).strip()
-            if not description:
-                description = ''.join(
-                    tree.xpath("//h3[text()='Description']/following-sibling::span/text()"))
-            images = tree.xpath(
-                '//div[@class="product__media media media--transparent gradient global-media-settings"]/img/@src')
-            images = ['http:' + img if img.startswith('//') else img for img in images]
             subcategory = None
             material = id_['title']
             material_list_first_cat = ['linen/cotton', 'oyster linen', 'enhanced linen', 'heavyweight linen',
@@ -141,62 +232,9 @@ async def process_link_url(product_url: str, link: str):
                 if 'cotton' in description.lower():
                     subcategory = 'Natural Fiber'
             useCase = None
-            lead_time = \
-                ''.join(tree.xpath('//div[@class="product_quote"]/preceding-sibling::p/text()')).split(
-                    ":")[-1].strip()
             price = float(id_['price'])
-            collection = name.split()[0].lower()
-            variantGroup = data_for_color_and_variant_group.split('||')[0].lower().replace(' ', '-')
-            color = data_for_color_and_variant_group.split('||')[1].lower().strip()
             full_name = f'{name} - {color} ({material},per yard)'
             finish = None
-            width_data = ''.join(tree.xpath("//h3[text()='Specs']/following-sibling::p/text()")).strip()
-            match = re.search(r'FABRIC WIDTH:\s*([\d.]+[″"]?)', width_data)
-            fabric_width = None
-            if match:
-                fabric_width = match.group(1)
-            try:
-                width = float(fabric_width)
-            except:
-                width = ''
-            if not width:
-                width = None
-            try:
-                length = float(
-                    ''.join(tree.xpath("//p[contains(text(),'MATERIAL')]/text()[3]")).split(':')[
-                        1].split('(')[0].strip().split('x')[1].replace("'", '').strip()) * 12
-            except:
-                length = ''
-            if not length:
-                length = None
-            product_type = ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).strip()
-            match = re.search(r'\bhalf[-\s]?drop\b', product_type, re.IGNORECASE)
-            if match:
-                match = match.group()
-            try:
-                pattern_vertical = float(''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).split(
-                    'Vertical Repeat:')[1].split('"')[0].split('”')[0])
-            except:
-                pattern_vertical = ''
-            if not pattern_vertical:
-                pattern_vertical = None
-            try:
-                pattern_horizontal = float(
-                    ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).split(
-                        'Horizontal Repeat:')[1].replace('"', '').split('”')[0])
-            except:
-                pattern_horizontal = ''
-            if not pattern_horizontal:
-                try:
-                    pattern_horizontal = float(
-                        ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).split(':')[
-                            1].split('/')[0].split()[-1].replace('"', ''))
-                except:
-                    pattern_horizontal = ''
-            if not pattern_horizontal:
-                pattern_horizontal = None
-            care = ''.join(tree.xpath(
-                "//h3[contains(text(),' Care')]/parent::summary/following-sibling::div/p/text()")).strip()
             if 'Default Title' in material:
                 material = None
             specifications = {
@@ -221,13 +259,10 @@ async def process_link_url(product_url: str, link: str):
                 "priceUnit": price_unit,
                 "raw_text": raw_text
             }
-            Id_part = data_for_color_and_variant_group.strip().replace('||', '-').replace(' ', '-').lower()
             if material:
                 Id = f'eskayel-{Id_part}-{material.replace("/", "-")}'.strip().replace(' ', '-')
             else:
                 Id = f'eskayel-{Id_part}'.strip().replace(' ', '-')
-            sustainability = ''.join(tree.xpath(
-                "//h3[contains(text(),' Sustainability')]/parent::summary/following-sibling::div/p/text()")).strip()
             item = {"id": Id,
                     "name": full_name,
                     "vendor": 'Eskayel',
@@ -258,85 +293,49 @@ async def process_link_url(product_url: str, link: str):
                     "wasManuallyEdited": False,
                     "specifications": specifications,
                     "additionalData": additionalData}
-            await Actor.push_data([item])
+            await emit([item])
     elif 'rug' in link:
-        rug_types = [
-            "Hand-knotted",
-            "Hand-tufted",
-            "Handloom",
-            "Machine-made",
-            "Braided",
-            "Shag",
-            "Hooked",
-            "Natural Fiber"
-        ]
-        variant_listing = f"{product_url}/products.json"
-        json_response = await fetch_html(variant_listing)
-        variant_json = json.loads(json_response)
-        data_for_color_and_variant_group = variant_json['product']['title']
-
-        variant_data = variant_json['product']['variants']
+        name = fields['name']
+        full_name = name
+        useCase = None
+        lead_time = fields['lead_time'].split(":")[-1].strip().replace('***', '')
+        collection = name.split()[0].lower()
+        finish = None
+        price_unit = 'per sqft'
+        material = product_type
+        subcategory = None
+        material_list_one = ['Crossweave 100 Knot Count', 'Crossweave 120 Knot Count', '100 Persian Knot',
+                             '100 knot Tibetan Crossweave', '120 knot Tibetan Crossweave']
+        material_list_two = ['Flatweave', 'Moroccan Weave', 'Moroccan', 'Moroccan / flatweave']
+        material_list_three = ['Semi Shaggy Weave', 'Semi Shaggy Terrier Weave', 'Shaggy', 'Himalayan Shaggy Weave',
+                               'Semi Shaggy Lulu Weave']
+        material_list_four = ['High Low Pile']
+        material_list_five = ['Braided']
+        material_list_six = ['Hooked']
+        if material in material_list_one:
+            subcategory = 'Hand-knotted'
+        if material in material_list_two or 'Flatweave' in name or 'Moroccan Weave' in name:
+            subcategory = 'Handloom'
+        if material in material_list_three:
+            subcategory = 'Shag'
+        if material in material_list_four:
+            subcategory = 'Machine-made'
+        if material in material_list_five:
+            subcategory = 'Braided'
+        if material in material_list_six:
+            subcategory = 'Hooked'
+        if material:
+            Id = f'eskayel-{Id_part}-{material.replace("/", "-")}'.strip().replace(' ', '-')
+        else:
+            Id = f'eskayel-{Id_part}'.strip().replace(' ', '-')
         for id_ in variant_data:
             rug_id = id_['id']
             url = f'{product_url}?variant={rug_id}'
-            name = ''.join(tree.xpath('//div[@class="product__title"]/h1/text()'))
-            edited_rugs = ''
-            for rug in rug_types:
-                edited_rug = rug.lower().replace('-', ' ')
-                edited_name = name.lower()
-                if edited_rug in edited_name:
-                    edited_rugs += edited_rug.title().replace(' ', '-')
-
-            full_name = name
-            description = ''.join(
-                tree.xpath("//h3[text()='Description']/following-sibling::p//text()")).strip()
-            if not description:
-                description = ''.join(
-                    tree.xpath("//h3[text()='Description']/following-sibling::span/text()"))
-            images = tree.xpath(
-                '//div[@class="product__media media media--transparent gradient global-media-settings"]/img/@src')
-            images = ['http:' + img if img.startswith('//') else img for img in images]
-
-            useCase = None
-            lead_time = \
-                ''.join(tree.xpath('//div[@class="product_quote"]/preceding-sibling::p/text()')).split(
-                    ":")[-1].strip().replace('***', '')
             price = float(id_['price'])
-            collection = name.split()[0].lower()
-            finish = None
-            product_type = ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).strip()
-            care = ''.join(tree.xpath(
-                "//h3[contains(text(),' Care')]/parent::summary/following-sibling::div/p/text()")).strip()
-
-            price_unit = 'per sqft'
             additionalData = {
                 "priceUnit": price_unit,
                 "raw_text": raw_text
             }
-            variantGroup = data_for_color_and_variant_group.split('||')[0].lower().replace(' ', '-')
-            color = data_for_color_and_variant_group.split('||')[1].lower().strip()
-            material = ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).strip()
-            subcategory = None
-            material_list_one = ['Crossweave 100 Knot Count', 'Crossweave 120 Knot Count', '100 Persian Knot',
-                                 '100 knot Tibetan Crossweave', '120 knot Tibetan Crossweave']
-            material_list_two = ['Flatweave', 'Moroccan Weave', 'Moroccan', 'Moroccan / flatweave']
-            material_list_three = ['Semi Shaggy Weave', 'Semi Shaggy Terrier Weave', 'Shaggy', 'Himalayan Shaggy Weave',
-                                   'Semi Shaggy Lulu Weave']
-            material_list_four = ['High Low Pile']
-            material_list_five = ['Braided']
-            material_list_six = ['Hooked']
-            if material in material_list_one:
-                subcategory = 'Hand-knotted'
-            if material in material_list_two or 'Flatweave' in name or 'Moroccan Weave' in name:
-                subcategory = 'Handloom'
-            if material in material_list_three:
-                subcategory = 'Shag'
-            if material in material_list_four:
-                subcategory = 'Machine-made'
-            if material in material_list_five:
-                subcategory = 'Braided'
-            if material in material_list_six:
-                subcategory = 'Hooked'
             specifications = {
                 "dimensions": {'width': None,
                                'length': None,
@@ -354,11 +353,6 @@ async def process_link_url(product_url: str, link: str):
                 "performance": None,
                 "care": care
             }
-            Id_part = data_for_color_and_variant_group.strip().replace('||', '-').replace(' ', '-').lower()
-            if material:
-                Id = f'eskayel-{Id_part}-{material.replace("/", "-")}'.strip().replace(' ', '-')
-            else:
-                Id = f'eskayel-{Id_part}'.strip().replace(' ', '-')
             item = {"id": Id,
                     "name": full_name,
                     "vendor": 'Eskayel',
@@ -389,40 +383,27 @@ async def process_link_url(product_url: str, link: str):
                     "wasManuallyEdited": False,
                     "specifications": specifications,
                     "additionalData": additionalData}
-            await Actor.push_data([item])
+            await emit([item])
     else:
-        variant_listing = f"{product_url}/products.json"
-        json_response = await fetch_html(variant_listing)
-        variant_json = json.loads(json_response)
-        data_for_color_and_variant_group = variant_json['product']['title']
-        name = ''.join(tree.xpath('//div[@class="product__title"]/h1//text()'))
-        add_up_name = ''.join(tree.xpath('//div[@class="product_quote"]/preceding-sibling::p/text()')).split('LEAD')[
+        name = fields['full_title']
+        add_up_name = fields['lead_time'].split('LEAD')[
             0].strip().replace(':', '(').replace('”', 'in').replace("'", 'ft)').title().replace('In', 'in').replace(
             'Ft', 'ft').strip().replace('( ', '(')
         full_name = name + ' – ' + add_up_name
-        description = ''.join(tree.xpath("//h3[text()='Description']/following-sibling::p//text()")).strip()
-        if not description:
-            description = ''.join(tree.xpath("//h3[text()='Description']/following-sibling::span/text()"))
-        images = tree.xpath(
-            '//div[@class="product__media media media--transparent gradient global-media-settings"]/img/@src')
-        images = ['http:' + img if img.startswith('//') else img for img in images]
         url = product_url
-        material = ''.join(tree.xpath("//h3[text()='Specs']/following-sibling::p/text()")).strip()
+        material = fields['specs']
         material_match = re.search(r'-\s*MATERIAL:\s*(.+)', material, re.IGNORECASE)
         if material_match:
             material = material_match.group(1).strip().split(',')[0].strip().lower().replace('100% ', '')
         useCase = None
-        lead_time = ''.join(tree.xpath('//div[@class="product_quote"]/preceding-sibling::p/text()')).split(":")[
-            -1].strip()
-        price = float(
-            ''.join(tree.xpath('//span[@class="price-item price-item--regular"]/text()')).split('/')[0].replace(
-                '$', ''))
+        lead_time = fields['lead_time'].split(":")[-1].strip()
+        price = float(fields['price'].split('/')[0].replace('$', ''))
         collection = name.split()[0].lower()
 
         finish = None
         try:
             width = float(
-                ''.join(tree.xpath("//p[contains(text(),'MATERIAL')]/text()[3]")).split(':')[1].split('(')[
+                fields['material_line'].split(':')[1].split('(')[
                     0].strip().split('x')[0].replace('” ', '').replace('" ', ''))
         except:
             width = ''
@@ -430,44 +411,36 @@ async def process_link_url(product_url: str, link: str):
             width = None
         try:
             length = float(
-                ''.join(tree.xpath("//p[contains(text(),'MATERIAL')]/text()[3]")).split(':')[1].split('(')[
+                fields['material_line'].split(':')[1].split('(')[
                     0].strip().split('x')[1].replace("'", '').strip()) * 12
         except:
             length = ''
         if not length:
             length = None
 
-        product_type = ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).strip()
         match = re.search(r'\bhalf[-\s]?drop\b', product_type, re.IGNORECASE)
         if match:
             match = match.group()
         try:
-            pattern_vertical = float(
-                ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).split('Vertical Repeat:')[
-                    1].split('"')[0])
+            pattern_vertical = float(fields['product_quote'].split('Vertical Repeat:')[1].split('"')[0])
         except:
             pattern_vertical = ''
         if not pattern_vertical:
             pattern_vertical = None
         try:
-            pattern_horizontal = float(
-                ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).split('Horizontal Repeat')[
-                    1].replace('"', ''))
+            pattern_horizontal = float(fields['product_quote'].split('Horizontal Repeat')[1].replace('"', ''))
         except:
             pattern_horizontal = ''
         if not pattern_horizontal:
             try:
                 pattern_horizontal = float(
-                    ''.join(tree.xpath('//div[@class="product_quote"]/p/text()')).split(':')[1].split('/')[
-                        0].split()[-1].replace('"', ''))
+                    fields['product_quote'].split(':')[1].split('/')[0].split()[-1].replace('"', ''))
             except:
                 pattern_horizontal = ''
         if not pattern_horizontal:
             pattern_horizontal = None
         if 'Default Title' in material:
             material = None
-        variantGroup = data_for_color_and_variant_group.split('||')[0].lower().replace(' ', '-')
-        color = data_for_color_and_variant_group.split('||')[1].lower().strip()
         specifications = {
             "dimensions": {'width': width,
                            'length': length,
@@ -490,7 +463,6 @@ async def process_link_url(product_url: str, link: str):
             "priceUnit": 'per roll',
             "raw_text": raw_text
         }
-        Id_part = data_for_color_and_variant_group.strip().replace('||', '-').replace(' ', '-').lower()
         if material:
             Id = f'eskayel-{Id_part}-{material.replace("/", "-")}'.strip().replace(' ', '-')
         else:
@@ -525,4 +497,4 @@ async def process_link_url(product_url: str, link: str):
                 "wasManuallyEdited": False,
                 "specifications": specifications,
                 "additionalData": additionalData}
-        await Actor.push_data([item])
+        await emit([item])
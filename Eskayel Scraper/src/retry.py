@@ -0,0 +1,82 @@
+"""Retry policy shared by every request sent through `http_client.fetch()`.
+
+Timeouts, dropped connections, 429 and 5xx responses are retried with exponential backoff and jitter, honouring
+`Retry-After` when the server sends one. Anything else is returned (or raised) straight away. Attempts are bounded
+and so is the total time spent on one URL, so a single hung page cannot pin the run.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from apify import Actor
+from httpx import NetworkError, RemoteProtocolError, Response, TimeoutException
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (TimeoutException, NetworkError, RemoteProtocolError)
+
+_retry_context = {
+    "max_retries": 3,
+    "retry_base_delay": 1.0,
+    "retry_max_delay": 30.0,
+    "max_retry_time": 120.0,
+}
+
+
+async def configure_retries(actor_input: dict) -> None:
+    for key in _retry_context:
+        if actor_input.get(key) is not None:
+            _retry_context[key] = type(_retry_context[key])(actor_input[key])
+
+
+async def with_retries(url: str, send) -> Response:
+    """Call `send()` until it yields a non-retryable response or the attempt/time budget for `url` runs out.
+
+    When the budget runs out the last response is returned, or the last error re-raised.
+    """
+    deadline = time.monotonic() + _retry_context["max_retry_time"]
+    attempt = 0
+    while True:
+        attempt += 1
+        error = None
+        response = None
+        try:
+            response = await asyncio.wait_for(send(), max(deadline - time.monotonic(), 0.001))
+        except RETRYABLE_ERRORS as exc:
+            error = exc
+        except asyncio.TimeoutError:
+            raise TimeoutException(f'Gave up on {url} after {_retry_context["max_retry_time"]:.0f}s') from None
+        if error is None and response.status_code not in RETRYABLE_STATUS_CODES:
+            return response
+        delay = _retry_after(response) if response is not None else None
+        if delay is None:
+            delay = min(_retry_context["retry_max_delay"], _retry_context["retry_base_delay"] * 2 ** (attempt - 1))
+            delay = random.uniform(delay / 2, delay)
+        if attempt > _retry_context["max_retries"] or time.monotonic() + delay > deadline:
+            if error is not None:
+                raise error
+            return response
+        reason = type(error).__name__ if error is not None else f'status {response.status_code}'
+        Actor.log.warning(f'Retrying {url} in {delay:.1f}s after {reason} (attempt {attempt}).')
+        await asyncio.sleep(delay)
+
+
+def _retry_after(response: Response) -> float | None:
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,137 @@
+"""Incremental crawl state kept between runs in a named key-value store.
+
+Handlers call `product_unchanged()` with a fingerprint of the source data a product is built from (the embedded
+product JSON where the page has one, otherwise its visible text) before doing any real parsing. Every item pushed
+through `pipeline.emit()` is recorded under the product being handled, so the state maps each product to its
+fingerprint and the item `id`s it produced. With `incremental` set in the Actor input, products whose fingerprint
+matches the previous run are skipped, and item ids that were not produced again are pushed as removal records
+(`{"id": ..., "removed": true}`) at the end of the run. Removals assume the run covers the same start URLs.
+The state is only saved when the run finishes without an error.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from apify import Actor
+
+from .dataset import push_items
+
+STATE_KEY = 'STATE'
+
+_incremental_context = {
+    "enabled": False,
+    "store": None,
+    "previous": {},
+    "current": {},
+    "skipped": 0,
+}
+
+_current_product = ContextVar("_current_product", default=None)
+
+
+@asynccontextmanager
+async def incremental_run(store_name: str):
+    """Load the state of the previous run and, when the run succeeds, report removed items and save the new state.
+
+    Enter it before `product_pipeline()` so every product has been handled by the time it closes.
+    """
+    actor_input = await Actor.get_input() or {}
+    store = await Actor.open_key_value_store(name=store_name)
+    _incremental_context.update({
+        "enabled": bool(actor_input.get("incremental", False)),
+        "store": store,
+        "previous": await store.get_value(STATE_KEY) or {},
+        "current": {},
+        "skipped": 0,
+    })
+    yield
+    if _incremental_context["enabled"]:
+        removed = await _push_removed()
+        Actor.log.info(f'Incremental run: {_incremental_context["skipped"]} unchanged products skipped, '
+                       f'{removed} removed items reported.')
+    await store.set_value(STATE_KEY, _incremental_context["current"])
+
+
+def content_fingerprint(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = ''
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+async def product_unchanged(key: str, fingerprint: str) -> bool:
+    """Record the fingerprint of a product and tell whether it can be skipped because the last run saw the same one.
+
+    When it cannot, the items emitted for the rest of the current handler call are tracked under `key`.
+    """
+    previous = _incremental_context["previous"].get(key)
+    entry = _incremental_context["current"].setdefault(key, {"fingerprint": fingerprint, "ids": []})
+    entry["fingerprint"] = fingerprint
+    if _incremental_context["enabled"] and previous and previous["fingerprint"] == fingerprint:
+        entry["ids"] = sorted(set(entry["ids"]) | set(previous["ids"]))
+        _incremental_context["skipped"] += 1
+        Actor.log.info(f'Unchanged since the last run, skipping: {key}')
+        return True
+    _current_product.set(key)
+    return False
+
+
+def previous_fingerprint(key: str) -> str | None:
+    """The fingerprint the last run recorded for `key`; None when there is none or incremental runs are disabled."""
+    previous = _incremental_context["previous"].get(key)
+    if not _incremental_context["enabled"] or not previous:
+        return None
+    return previous["fingerprint"]
+
+
+def product_ids(key: str) -> list[str]:
+    """The item ids recorded for `key` in this run; for a skipped product, the ones it produced last time."""
+    entry = _incremental_context["current"].get(key)
+    return list(entry["ids"]) if entry is not None else []
+
+
+def track_item(item, key: str | None = None) -> None:
+    """Remember the ids of the items pushed for `key`, or for the product currently being handled."""
+    key = key or _current_product.get()
+    if key is None or _incremental_context["store"] is None:
+        return
+    entry = _incremental_context["current"].setdefault(key, {"fingerprint": None, "ids": []})
+    for one in item if isinstance(item, list) else [item]:
+        item_id = one.get("id")
+        if item_id and item_id not in entry["ids"]:
+            entry["ids"].append(item_id)
+
+
+@asynccontextmanager
+async def product_scope():
+    """Scope item tracking to one handler call; a failed product keeps its old ids and is re-parsed next run."""
+    token = _current_product.set(None)
+    try:
+        yield
+    except Exception:
+        key = _current_product.get()
+        if key is not None:
+            entry = _incremental_context["current"][key]
+            previous = _incremental_context["previous"].get(key) or {"ids": []}
+            entry["fingerprint"] = None
+            entry["ids"] = sorted(set(entry["ids"]) | set(previous["ids"]))
+        raise
+    finally:
+        _current_product.reset(token)
+
+
+async def _push_removed() -> int:
+    current_ids = {item_id for entry in _incremental_context["current"].values() for item_id in entry["ids"]}
+    previous_ids = {item_id for entry in _incremental_context["previous"].values() for item_id in entry["ids"]}
+    removed = sorted(previous_ids - current_ids)
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    if removed:
+        await push_items([{"id": item_id, "removed": True, "lastUpdated": timestamp} for item_id in removed])
+    return len(removed)
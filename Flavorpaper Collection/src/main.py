@@ -1,13 +1,19 @@
 from __future__ import annotations
 from urllib.parse import urljoin
 from lxml import html
-from bs4 import BeautifulSoup
-import gzip
-import base64
 from apify import Actor
-from httpx import AsyncClient
 from datetime import datetime
 
+from .dataset import dataset_writer
+from .executor import cpu_pool, run_cpu
+from .http_client import fetch, http_session
+from .incremental import content_fingerprint, incremental_run, product_unchanged
+from .page import encode_raw_text, page_text, parse_page
+from .pipeline import emit, enqueue, product_pipeline
+from .product_json import product_json_for_url
+from .shopify import (collection_products, product_description, product_fingerprint, product_images,
+                      shopify_product_url)
+
 
 _run_context = {
     "counter": 0  # MUST be an integer, not None
@@ -28,11 +34,39 @@ async def get_timestamp():
 
 
 async def fetch_html(url: str) -> str:
-    async with AsyncClient() as client:
-        Actor.log.info(f"Fetching: {url}")
-        response = await client.get(url, follow_redirects=False)
-        if response.status_code == 200:
-            return response.text
+    Actor.log.info(f"Fetching: {url}")
+    response = await fetch(url, follow_redirects=False)
+    if response.status_code == 200:
+        return response.text
+
+
+def page_fields(content) -> dict:
+    """Read what products.json does not have: the color subtitle and the Product Details list.
+
+    That is the vertical repeat and pattern match, maintenance, fire rating, lead time and the installation
+    instructions document.
+    """
+    details = '//*[contains(text(),"Product Details")]/following-sibling::div//p/strong[contains(text(),"{}")]'
+    repeat = ''.join(content.xpath(details.format('Vertical Repeat:') + '/parent::p/text()')).strip()
+    try:
+        repeatVertical = float(repeat.split('in')[0].strip())
+    except:
+        repeatVertical = None
+    try:
+        Type = repeat.split('in')[1].strip().replace('Match', '').strip()
+    except:
+        Type = None
+    document_url = ''.join(content.xpath(
+        details.format('Installation Instructions:') + '/following-sibling::a/@href')).strip()
+    return {
+        "color": ''.join(content.xpath('//h1/following-sibling::p[1]/text()')).strip(),
+        "repeatVertical": repeatVertical,
+        "type": Type or None,
+        "care": ''.join(content.xpath(details.format('Maintenance:') + '/parent::p/text()')).strip() or None,
+        "fire_rating": ''.join(content.xpath(details.format('Fire Rating:') + '/parent::p/text()')).strip() or None,
+        "lead_time": ''.join(content.xpath(details.format('Lead Time:') + '/parent::p/text()')).strip() or None,
+        "document_url": 'https:' + document_url if document_url else None,
+    }
 
 
 async def main() -> None:
@@ -43,7 +77,14 @@ async def main() -> None:
     the field of web scraping significantly.
     """
     # Enter the context of the Actor.
-    async with Actor:
+    async with (
+        Actor,
+        http_session(cache_store='flavorpaper-http-cache'),
+        cpu_pool(),
+        dataset_writer(),
+        incremental_run('flavorpaper-incremental'),
+        product_pipeline(process_link_url),
+    ):
         # Retrieve the Actor input, and use default values if not provided.
         actor_input = await Actor.get_input() or {}
         start_urls = actor_input.get('start_urls', [
@@ -57,72 +98,56 @@ async def main() -> None:
 
         # Enqueue the start URLs with an initial crawl depth of 0.
         for start_url in start_urls:
-            async with AsyncClient() as client:
-                try:
-                    response = await client.get(start_url, follow_redirects=True)
-                    tree = html.fromstring(response.text)
-                    all_hits = tree.xpath('//div[@class="card-media"]/a/@href')
-                    for hit in all_hits:
-                        product_url = urljoin('https://www.flavorpaper.com/', hit)
-                        await process_link_url(product_url)
-                except Exception:
-                    Actor.log.exception(f'Cannot extract data from {start_url}.')
-
-
-async def process_link_url(product_url: str):
+            products = await collection_products(start_url)
+            if products is not None:
+                for product in products:
+                    await enqueue(shopify_product_url(start_url, product), product)
+                continue
+            try:
+                response = await fetch(start_url, follow_redirects=True)
+                tree = html.fromstring(response.text)
+                all_hits = tree.xpath('//div[@class="card-media"]/a/@href')
+                for hit in all_hits:
+                    product_url = urljoin('https://www.flavorpaper.com/', hit)
+                    await enqueue(product_url)
+            except Exception:
+                Actor.log.exception(f'Cannot extract data from {start_url}.')
+
+
+async def process_link_url(product_url: str, product: dict | None = None):
+    if product is not None and await product_unchanged(product_url, product_fingerprint(product)):
+        return
     response = await fetch_html(product_url)
-    soup = BeautifulSoup(response, 'html.parser')
-    visible_text = soup.get_text(strip=True)
-    compressed = gzip.compress(visible_text.encode('utf-8'))
-    raw_text = base64.b64encode(compressed).decode('utf-8')
-    content = html.fromstring(response)
-    variants = content.xpath('//input[@class="searchvariant"]')
-    product_title = ' - '.join(content.xpath(
-        '//div[@class="product__title"]/h1/following-sibling::p[1]/text() | //div[@class="product__title"]/h1/text()')).strip()
+    if not response:
+        Actor.log.info(f"Response Not Found: {product_url}")
+        return
+    content = await run_cpu(parse_page, response)
+    visible_text = await run_cpu(page_text, content)
+    if product is None and await product_unchanged(product_url, content_fingerprint(visible_text)):
+        return
+    raw_text = await run_cpu(encode_raw_text, visible_text)
+    if product is None:
+        # Listed from the collection page: the title, variants, images and description come from the product's JSON.
+        product = await product_json_for_url(product_url)
+        if product is None:
+            Actor.log.info(f"Product JSON Not Found: {product_url}")
+            return
+    fields = await run_cpu(page_fields, content)
+    product_title = product['title'].strip()
     variantGroup = product_title.split('-')[0].strip().replace(' ', '-').lower()
-    Color = ''.join(content.xpath('//h1/following-sibling::p[1]/text()')).strip()
-    try:
-        repeatVertical = float(''.join(content.xpath(
-            '//*[contains(text(),"Product Details")]/following-sibling::div//p/strong[contains(text(),"Vertical Repeat:")]/parent::p/text()')).strip().split(
-            'in')[0].strip())
-    except:
-        repeatVertical = None
-    try:
-        Type = ''.join(content.xpath(
-            '//*[contains(text(),"Product Details")]/following-sibling::div//p/strong[contains(text(),"Vertical Repeat:")]/parent::p/text()')).strip().split(
-            'in')[1].strip().replace('Match', '').strip()
-    except:
-        Type = None
-    if not Type:
-        Type = None
-    care = ''.join(content.xpath(
-        '//*[contains(text(),"Product Details")]/following-sibling::div//p/strong[contains(text(),"Maintenance:")]/parent::p/text()')).strip()
-    if not care:
-        care = None
-    fire_rating = ''.join(content.xpath(
-        '//*[contains(text(),"Product Details")]/following-sibling::div//p/strong[contains(text(),"Fire Rating:")]/parent::p/text()')).strip()
-    if not fire_rating:
-        fire_rating = None
-    description = ''.join(content.xpath("//div[contains(@id, 'main-description')]//text()")).strip()
-    if not description:
-        description = None
-    Images = []
-    images = content.xpath('//div[@class="thumbnails"]/img/@src')
-    for image in images:
-        image = f"https:{image}"
-        Images.append(image)
-    lead_time = ''.join(content.xpath(
-        '//*[contains(text(),"Product Details")]/following-sibling::div//p/strong[contains(text(),"Lead Time:")]/parent::p/text()')).strip()
-    if not lead_time:
-        lead_time = None
-    document_url = 'https:'+''.join(content.xpath(
-        '//*[contains(text(),"Product Details")]/following-sibling::div//p/strong[contains(text(),"Installation Instructions:")]/following-sibling::a/@href')).strip()
-    if not document_url:
-        document_url = None
-    for variant in variants:
-        variant_title = ''.join(variant.xpath('./@data-title')).strip()
-        variant_price = float(''.join(variant.xpath('./@data-price')).replace('$', '').replace(',', '').strip())
-        variant_id = ''.join(variant.xpath('./@value')).strip()
+    Color = fields['color']
+    repeatVertical = fields['repeatVertical']
+    Type = fields['type']
+    care = fields['care']
+    fire_rating = fields['fire_rating']
+    description = product_description(product)
+    Images = product_images(product)
+    lead_time = fields['lead_time']
+    document_url = fields['document_url']
+    for variant in product['variants']:
+        variant_title = variant['title'].strip()
+        variant_price = float(variant['price'])
+        variant_id = variant['id']
         variant_url = urljoin(product_url, f'?variant={variant_id}')
         Id = f"flavorpaper-{product_title.replace(' - ', ' ').replace('!', '').replace('-', '').replace(' ', '-')}-{variant_title.split('-')[0].strip().replace(' / ', ' ').replace(' - ', ' ').replace(' ', '-')}".lower()
         name = f"{product_title} {variant_title.split('-')[0].strip()}"
@@ -184,4 +209,4 @@ async def process_link_url(product_url: str):
             "specifications": specifications,
             "additionalData": additionalData
         }
-        await Actor.push_data(item)
\ No newline at end of file
+        await emit(item)
\ No newline at end of file
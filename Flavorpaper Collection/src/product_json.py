@@ -0,0 +1,55 @@
+"""Memoized lookup of single Shopify products through `/products/<handle>.json`.
+
+`product_json()` reads a product's JSON once per run: handlers that need it for every variant share the first
+lookup, including while it is still in flight, and a handle that does not exist is remembered as such. Failures
+other than a 404 are not remembered, so a later lookup tries again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from urllib.parse import urlsplit
+
+from apify import Actor
+
+from .http_client import fetch
+
+_product_json_context = {
+    # (base URL, handle) -> task resolving to the product, or None for a handle that does not exist.
+    "products": {},
+}
+
+
+async def product_json(base_url: str, handle: str) -> dict | None:
+    """Return the `product` object of `/products/<handle>.json`, or None when it cannot be read."""
+    products = _product_json_context["products"]
+    key = (base_url, handle)
+    task = products.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_product_json(base_url, handle))
+        products[key] = task
+    # A cancelled caller must not cancel the lookup the other callers are waiting for.
+    return await asyncio.shield(task)
+
+
+async def product_json_for_url(product_url: str) -> dict | None:
+    """`product_json()` of the product a storefront URL points to, with or without a collection in its path."""
+    parts = urlsplit(product_url)
+    return await product_json(f'{parts.scheme}://{parts.netloc}', parts.path.rstrip('/').split('/')[-1])
+
+
+async def _load_product_json(base_url: str, handle: str) -> dict | None:
+    url = f'{base_url}/products/{handle}.json'
+    try:
+        response = await fetch(url, follow_redirects=True)
+        if response.status_code == 404:
+            return None
+        if response.status_code == 200:
+            return response.json()['product']
+        Actor.log.warning(f'Cannot read {url}: HTTP {response.status_code}.')
+    except (ValueError, KeyError, TypeError):
+        Actor.log.warning(f'Cannot read {url}: not a product JSON.')
+    except Exception:
+        Actor.log.exception(f'Cannot fetch {url}.')
+    _product_json_context["products"].pop((base_url, handle), None)
+    return None
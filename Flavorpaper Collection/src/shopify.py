@@ -0,0 +1,101 @@
+"""Shopify catalog listing through the storefront's `products.json` endpoint.
+
+Walking collection pages means one HTML request per page of 12-48 tiles, plus a product page (and sometimes a
+product JSON) per product before anything is known about it. `/collections/<handle>/products.json?limit=250`
+returns the products of a collection with all their variants, images and tags, 250 at a time, so a whole
+collection is listed in a handful of requests. The handlers build their items from these products and still fetch
+the product pages, but only for `raw_text` and the fields that only exist in the HTML; each actor's
+`page_fields()` names them.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from urllib.parse import urlsplit
+
+from apify import Actor
+from lxml import html
+
+from .http_client import fetch
+from .incremental import content_fingerprint
+
+SHOPIFY_PAGE_SIZE = 250
+
+
+async def collection_products(collection_url: str) -> list[dict] | None:
+    """Return every product of a collection, or None when `products.json` cannot be read for it.
+
+    `https://shop/collections/<handle>/<tag>` lists only the products tagged `<tag>`, like the storefront does.
+    """
+    collection = _collection(collection_url)
+    if collection is None:
+        return None
+    base_url, handle, tags = collection
+    products = []
+    page = 1
+    while True:
+        try:
+            response = await fetch(f'{base_url}/collections/{handle}/products.json', follow_redirects=True,
+                                   params={'limit': SHOPIFY_PAGE_SIZE, 'page': page})
+        except Exception:
+            Actor.log.exception(f'Cannot list {collection_url} through products.json.')
+            return None
+        try:
+            batch = response.json()['products'] if response.status_code == 200 else None
+        except (ValueError, KeyError, TypeError):
+            batch = None
+        if batch is None:
+            Actor.log.info(f'No products.json for {collection_url}, listing the collection pages instead.')
+            return None
+        products.extend(batch)
+        if len(batch) < SHOPIFY_PAGE_SIZE:
+            break
+        page += 1
+    if tags:
+        products = [product for product in products if tags <= {_handleize(tag) for tag in _tags(product)}]
+    Actor.log.info(f'Found {len(products)} products in {collection_url} through products.json.')
+    return products
+
+
+def shopify_product_url(collection_url: str, product: dict, in_collection: bool = False) -> str:
+    """Build the storefront URL of a product, inside the collection path when `in_collection` is set."""
+    base_url, handle, _ = _collection(collection_url)
+    if in_collection:
+        return f'{base_url}/collections/{handle}/products/{product["handle"]}'
+    return f'{base_url}/products/{product["handle"]}'
+
+
+def product_fingerprint(product: dict) -> str:
+    """Fingerprint of a catalog entry; it changes with the product, its variants and prices."""
+    return content_fingerprint(json.dumps(product, sort_keys=True))
+
+
+def product_images(product: dict) -> list[str]:
+    return [image['src'] for image in product.get('images') or []]
+
+
+def product_description(product: dict) -> str | None:
+    """Text of the product's `body_html`, with the line breaks between its paragraphs."""
+    body_html = (product.get('body_html') or '').strip()
+    if not body_html:
+        return None
+    return ''.join(html.fragment_fromstring(body_html, create_parent='div').itertext()).strip() or None
+
+
+def _collection(collection_url: str) -> tuple[str, str, set] | None:
+    parts = urlsplit(collection_url)
+    segments = [segment for segment in parts.path.split('/') if segment]
+    if len(segments) < 2 or segments[0] != 'collections':
+        return None
+    tags = set(segments[2].split('+')) if len(segments) > 2 else set()
+    return f'{parts.scheme}://{parts.netloc}', segments[1], tags
+
+
+def _tags(product: dict) -> list:
+    tags = product.get('tags') or []
+    return tags.split(', ') if isinstance(tags, str) else tags
+
+
+def _handleize(text: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
@@ -0,0 +1,98 @@
+"""Buffered dataset writer.
+
+Handlers push many small items, often one per variant, and every `Actor.push_data` call is its own storage API
+request. Items are collected here instead and written in batches once `push_batch_size` items or
+`push_batch_bytes` bytes are buffered, or every `push_interval` seconds. Only one batch is written at a time: when
+storage is slow, producers that fill the buffer wait for the write in progress, which slows the pipeline down
+instead of growing the buffer. Whatever is buffered is written when the Actor migrates or is aborted, and when the
+writer is closed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from apify import Actor, Event
+
+_dataset_context = {
+    "active": False,
+    "buffer": [],
+    "bytes": 0,
+    "lock": None,
+    "options": {
+        "push_batch_size": 500,
+        "push_batch_bytes": 5 * 1024 * 1024,
+        "push_interval": 5.0,
+    },
+}
+
+
+@asynccontextmanager
+async def dataset_writer():
+    """Buffer `push_items()` calls for as long as the context is open; enter it before the pipeline."""
+    actor_input = await Actor.get_input() or {}
+    options = _dataset_context["options"]
+    for key in options:
+        if actor_input.get(key) is not None:
+            options[key] = type(options[key])(actor_input[key])
+    _dataset_context.update({"active": True, "buffer": [], "bytes": 0, "lock": asyncio.Lock()})
+    Actor.on(Event.MIGRATING, _flush_on_event)
+    Actor.on(Event.ABORTING, _flush_on_event)
+    flusher = asyncio.create_task(_flush_periodically())
+    try:
+        yield
+    finally:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+        Actor.off(Event.MIGRATING, _flush_on_event)
+        Actor.off(Event.ABORTING, _flush_on_event)
+        await flush()
+        _dataset_context["active"] = False
+
+
+async def push_items(item) -> None:
+    """Queue a dataset item (or a list of items), writing a batch when the buffer is full."""
+    if not _dataset_context["active"]:
+        await Actor.push_data(item)
+        return
+    items = item if isinstance(item, list) else [item]
+    options = _dataset_context["options"]
+    _dataset_context["buffer"].extend(items)
+    _dataset_context["bytes"] += sum(len(json.dumps(one, default=str)) for one in items)
+    if (len(_dataset_context["buffer"]) >= options["push_batch_size"]
+            or _dataset_context["bytes"] >= options["push_batch_bytes"]):
+        await flush()
+
+
+async def flush() -> None:
+    """Write everything buffered so far; waits for a write already in progress first."""
+    if _dataset_context["lock"] is None:
+        return
+    async with _dataset_context["lock"]:
+        items = _dataset_context["buffer"]
+        if not items:
+            return
+        _dataset_context["buffer"] = []
+        _dataset_context["bytes"] = 0
+        try:
+            await Actor.push_data(items)
+        except Exception:
+            # Keep the batch so the next flush retries it.
+            _dataset_context["buffer"][:0] = items
+            _dataset_context["bytes"] += sum(len(json.dumps(one, default=str)) for one in items)
+            raise
+
+
+async def _flush_periodically() -> None:
+    while True:
+        await asyncio.sleep(_dataset_context["options"]["push_interval"])
+        try:
+            await flush()
+        except Exception:
+            Actor.log.exception('Cannot write buffered items to the dataset.')
+
+
+async def _flush_on_event(_event_data=None) -> None:
+    await flush()
@@ -8,19 +8,23 @@ https://docs.apify.com/sdk/python
 
 from __future__ import annotations
 
+import asyncio
 import re
-import time
+import httpx
 from urllib.parse import urljoin
-from lxml import html
-from bs4 import BeautifulSoup
-import gzip
-import base64
 from apify import Actor
-from httpx import AsyncClient
-import json
 from datetime import datetime
 
-deduped_items = {}
+from .dataset import dataset_writer, push_items
+from .executor import cpu_pool, run_cpu
+from .http_client import fetch, http_session
+from .incremental import content_fingerprint, incremental_run, product_ids, product_unchanged, track_item
+from .page import embedded_json, encode_raw_text, page_text, parse_page
+from .pipeline import enqueue, join_pipeline, product_pipeline
+from .variants import best_variants, claim_ids, keep_variant, variant_store
+
+PRODUCT_TILE_XPATH = '//div[@class="b-product-tile__wishlist js-product"]/following-sibling::a/@href'
+RESULT_COUNT_XPATH = '//*[contains(concat(" ", normalize-space(@class), " "), " search-result-count ")]'
 
 _run_context = {
     "counter": 0  # MUST be an integer, not None
@@ -57,25 +61,10 @@ async def fetch_html(url: str, params) -> str:
         'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36',
 
     }
-    async with AsyncClient(timeout=30.0) as client:
-        Actor.log.info(f"Fetching: {url}")
-        response = await client.get(url, follow_redirects=False, params=params, headers=headers)
-        if response.status_code == 200:
-            return response.text
-    if response.status_code != 200:
-        retry = 1
-        while True:
-            time.sleep(2)
-            if retry > 3:
-                break
-            async with AsyncClient() as client:
-                Actor.log.info(f"Fetching: {url}")
-                response = await client.get(url, follow_redirects=False, params=params, headers=headers)
-                if response.status_code == 200:
-                    break
-                retry += 1
-        if response.status_code == 200:
-            return response.text
+    Actor.log.info(f"Fetching: {url}")
+    response = await fetch(url, follow_redirects=False, params=params, headers=headers)
+    if response.status_code == 200:
+        return response.text
 
 
 async def main() -> None:
@@ -85,7 +74,15 @@ async def main() -> None:
     Asynchronous execution is required for communication with Apify platform, and it also enhances performance in
     the field of web scraping significantly.
     """
-    async with Actor:
+    async with (
+        Actor,
+        http_session(cache_store='flor-http-cache'),
+        cpu_pool(),
+        dataset_writer(),
+        incremental_run('flor-incremental'),
+        variant_store(),
+        product_pipeline(process_link_url),
+    ):
         Actor.log.info('Hello from the Actor!')
         actor_input = await Actor.get_input() or {}
         start_urls = actor_input.get('start_urls', [
@@ -97,57 +94,125 @@ async def main() -> None:
             Actor.log.info('No start URLs specified in Actor input, exiting...')
             await Actor.exit()
 
+        page_size = int(actor_input.get("grid_page_size", 48))
+        concurrency = max(1, int(actor_input.get("grid_concurrency", 4)))
         for start_url in start_urls:
-
-            All_Link = []
-            sz = 48
-            while True:
-                params = {
-                    'start': '0',
-                    'sz': f'{sz}',
-                }
-                updated_start_url = start_url
-                try:
-                    response = await fetch_html(updated_start_url, params)
-                    if response:
-                        tree = html.fromstring(response)
-                        all_links = tree.xpath(
-                            '//div[@class="b-product-tile__wishlist js-product"]/following-sibling::a/@href')
-                        if len(All_Link) == len(all_links):
-                            break
-                        for link in all_links:
-                            link_url = urljoin('https://www.flor.com', link)
-                            if "/sale/" in link_url:
-                                continue
-                            if link_url in All_Link:
-                                continue
-                            if link_url.startswith(('http://', 'https://')):
-                                All_Link.append(link_url)
-                        sz += 24
-
-                except Exception as e:
-                    Actor.log.exception(f'Cannot extract data from {updated_start_url}.')
-                    print(e)
+            try:
+                All_Link = await list_grid(start_url, page_size, concurrency)
+            except Exception:
+                Actor.log.exception(f'Cannot extract data from {start_url}.')
+                continue
             for product_url in All_Link:
-                await process_link_url(product_url)
+                await enqueue(product_url)
 
-        all_unique_items = [data for _, data in deduped_items.values()]
-        for unique_items in all_unique_items:
+        await join_pipeline()
+        async for unique_items in best_variants():
             unique_items['sourceRunId'] = await generate_source_run_id()
-            await Actor.push_data(unique_items)
+            await push_items(unique_items)
+
+
+async def list_grid(start_url: str, page_size: int, concurrency: int) -> list[str]:
+    """List the product URLs of a Salesforce Commerce Cloud category grid, one `start` offset per page.
+
+    The first page gives the number of results and, through its "more" button, the `Search-UpdateGrid` URL that
+    returns the tiles alone; the other offsets up to that count are then requested concurrently, and the ones that
+    fail are tried once more on their own. The offsets after them are walked in order until a page adds no product,
+    which covers a missing or outdated count.
+    """
+    first = await fetch_html(grid_page_url(start_url, 0, page_size), None)
+    if not first:
+        return []
+    tree = await run_cpu(parse_page, first)
+    pages = [tree]
+    grid_url = next(iter(tree.xpath('//*[contains(@data-url, "Search-UpdateGrid")]/@data-url')), start_url)
+    grid_url = urljoin(start_url, grid_url)
+
+    async def load(start):
+        """The parsed grid page at offset `start`, or None when it cannot be fetched."""
+        try:
+            response = await fetch_html(grid_page_url(grid_url, start, page_size), None)
+        except Exception:
+            Actor.log.exception(f'Cannot fetch the grid of {start_url} at offset {start}.')
+            return None
+        return await run_cpu(parse_page, response) if response else None
+
+    total = grid_total(tree)
+    if total is not None:
+        Actor.log.info(f'{total} products in {start_url}, listing them {page_size} at a time.')
+        slots = asyncio.Semaphore(concurrency)
+
+        async def load_concurrently(start):
+            async with slots:
+                return await load(start)
+
+        offsets = list(range(page_size, total, page_size))
+        loaded = await asyncio.gather(*(load_concurrently(start) for start in offsets))
+        for position, start in enumerate(offsets):
+            if loaded[position] is None:
+                loaded[position] = await load(start)
+                if loaded[position] is None:
+                    Actor.log.warning(f'The grid of {start_url} at offset {start} failed twice; '
+                                      f'its products are missing from this run.')
+        pages += loaded
+    All_Link = []
+    seen = set()
+
+    def add_links(page):
+        added = 0
+        for link in page.xpath(PRODUCT_TILE_XPATH):
+            link_url = urljoin('https://www.flor.com', link)
+            if "/sale/" in link_url or link_url in seen:
+                continue
+            if link_url.startswith(('http://', 'https://')):
+                seen.add(link_url)
+                All_Link.append(link_url)
+                added += 1
+        return added
+
+    for page in pages:
+        if page is not None:
+            add_links(page)
+    start = page_size * len(pages)
+    while True:
+        page = await load(start)
+        if page is None:
+            Actor.log.warning(f'Stopped listing {start_url} at offset {start}: the grid page cannot be fetched.')
+            break
+        if not add_links(page):
+            break
+        start += page_size
+    return All_Link
+
+
+def grid_page_url(grid_url: str, start: int, page_size: int) -> str:
+    """`grid_url` at offset `start`; the rest of its query, such as the category, is kept."""
+    return str(httpx.URL(grid_url).copy_merge_params({'start': start, 'sz': page_size}))
+
+
+def grid_total(tree) -> int | None:
+    """Number of products in the grid, from SFCC's results-count element; None when the page has none."""
+    for element in tree.xpath(RESULT_COUNT_XPATH):
+        match = re.search(r'\d[\d,]*', element.text_content())
+        if match:
+            return int(match.group().replace(',', ''))
+    return None
 
 
 async def process_link_url(product_url: str):
     content_html = await fetch_html(product_url, params=None)
-    soup = BeautifulSoup(content_html, 'html.parser')
-    visible_text = soup.get_text(strip=True)
-    compressed = gzip.compress(visible_text.encode('utf-8'))
-    raw_text = base64.b64encode(compressed).decode('utf-8')
-    tree = html.fromstring(content_html)
+    tree = await run_cpu(parse_page, content_html)
+    visible_text = await run_cpu(page_text, tree)
+    # --- Extract variant number from product_url (like -03, -07) ---
+    variant_match = re.search(r'(\d{2})\.html$', product_url)
+    variant_number = int(variant_match.group(1)) if variant_match else 0
+    if await product_unchanged(product_url, content_fingerprint(visible_text)):
+        # The items of an unchanged page were pushed by an earlier run; keep worse variants from replacing them.
+        claim_ids(product_ids(product_url), variant_number)
+        return
+    raw_text = await run_cpu(encode_raw_text, visible_text)
     error_page = tree.xpath('//img[@class="b-error-page__img h-visible-md h-visible-lg h-visible-xl h-visible-xxl"]')
     if not error_page:
-        variant_data_list = ''.join(tree.xpath('//div/@data-product')).strip()
-        json_data = json.loads(variant_data_list)
+        json_data = embedded_json(tree, '//div/@data-product')
         name_add_up_first_part = ''.join(tree.xpath('//h1[@id="productTitle"]/text()'))
         try:
             name_add_up_third_part = \
@@ -318,10 +383,6 @@ async def process_link_url(product_url: str):
                     updated_color.lower()
                 )
 
-                # --- Extract variant number from product_url (like -03, -07) ---
-                variant_match = re.search(r'(\d{2})\.html$', product_url)
-                variant_number = int(variant_match.group(1)) if variant_match else 0
-
                 item = {
                     "id": Id,
                     "name": name,
@@ -354,11 +415,7 @@ async def process_link_url(product_url: str):
                     "specifications": specifications,
                     "additionalData": additionalData
                 }
-                if fingerprint not in deduped_items:
-                    deduped_items[fingerprint] = (variant_number, item)
-                else:
-                    existing_variant_number, _ = deduped_items[fingerprint]
-                    if variant_number > existing_variant_number:
-                        deduped_items[fingerprint] = (variant_number, item)
+                track_item(item)
+                await keep_variant(fingerprint, variant_number, item)
     else:
         return False
@@ -0,0 +1,130 @@
+"""Best-variant deduplication with only an index kept in memory.
+
+The same rug is listed under several product URLs (`...-01.html`, `...-02.html`, `/sale/...`), and only the variant
+with the highest number is kept for each (base URL, size, color) fingerprint. Every finished item used to be held in
+a module-level dict until the end of the crawl, so memory grew with the catalog and a crash lost every item. Here an
+item is written to the run's key-value store as soon as it wins its fingerprint, and memory only holds fingerprint
+-> (variant number, record key). A better variant is written under its own key, and only once that write succeeds does
+the index point at it and the record it replaces get deleted. `best_variants()` then reads the winners back one at a
+time; their records are deleted only after the dataset flush that writes them has succeeded.
+A product page skipped as unchanged by the incremental mode still holds its items against worse variants: its ids are
+claimed with its variant number through `claim_ids()`.
+
+The index and the claims are saved to the store as `VARIANT-INDEX` whenever the platform asks Actors to persist
+their state, migrates the run or aborts it, and a restarted run picks them up again, so the records written before
+the restart still count. Fingerprints whose items reached the dataset stay in the index without a record, which keeps
+a restarted run from writing them twice.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from contextlib import asynccontextmanager
+
+from apify import Actor, Event
+
+from .dataset import flush
+
+INDEX_KEY = 'VARIANT-INDEX'
+# Items handed out by `best_variants()` between two dataset flushes.
+FLUSH_EVERY = 500
+
+_variant_context = {
+    "store": None,
+    "index": {},
+    "claimed": {},
+}
+
+
+@asynccontextmanager
+async def variant_store():
+    """Keep the variant index for as long as the context is open, resuming the one a restarted run saved."""
+    store = await Actor.open_key_value_store()
+    saved = await store.get_value(INDEX_KEY) or {}
+    index = {tuple(fingerprint): (variant_number, key) for fingerprint, variant_number, key in saved.get("index", [])}
+    if index:
+        Actor.log.info(f'Resuming with {len(index)} variant fingerprints from a previous start of this run.')
+    _variant_context.update({"store": store, "index": index, "claimed": saved.get("claimed", {})})
+    for event in (Event.PERSIST_STATE, Event.MIGRATING, Event.ABORTING):
+        Actor.on(event, _save_index)
+    try:
+        yield
+    finally:
+        for event in (Event.PERSIST_STATE, Event.MIGRATING, Event.ABORTING):
+            Actor.off(event, _save_index)
+        _variant_context.update({"store": None, "index": {}, "claimed": {}})
+
+
+async def keep_variant(fingerprint: tuple, variant_number: int, item: dict) -> None:
+    """Store `item` unless a variant with the same or a higher number was already kept for `fingerprint`."""
+    claimed = _variant_context["claimed"].get(item["id"])
+    if claimed is not None and variant_number <= claimed:
+        return
+    index = _variant_context["index"]
+    previous = index.get(fingerprint)
+    if previous is not None and (variant_number <= previous[0] or previous[1] is None):
+        return
+    digest = hashlib.sha1(_fingerprint_key(fingerprint).encode()).hexdigest()
+    key = f'VARIANT-{digest}-{variant_number}'
+    store = _variant_context["store"]
+    await store.set_value(key, item)
+    # Another handler may have kept a variant of this fingerprint while the record was being written.
+    current = index.get(fingerprint)
+    if current is not None and (variant_number <= current[0] or current[1] is None):
+        if current[1] != key:
+            await store.set_value(key, None)
+        return
+    index[fingerprint] = (variant_number, key)
+    if current is not None:
+        await store.set_value(current[1], None)
+
+
+def claim_ids(ids, variant_number: int) -> None:
+    """Keep items with these ids from being replaced by variants numbered `variant_number` or lower."""
+    claimed = _variant_context["claimed"]
+    for item_id in ids:
+        claimed[item_id] = max(claimed.get(item_id, variant_number), variant_number)
+
+
+async def best_variants():
+    """Yield the kept item of every fingerprint; records are deleted once the dataset holds their items."""
+    store = _variant_context["store"]
+    index = _variant_context["index"]
+    pending = [fingerprint for fingerprint, (_, key) in index.items() if key is not None]
+    Actor.log.info(f'Writing {len(pending)} deduplicated products.')
+    handed_out = []
+    for fingerprint in pending:
+        variant_number, key = index[fingerprint]
+        item = await store.get_value(key)
+        if item is None:
+            Actor.log.warning(f'The stored record {key} is missing, skipping it.')
+            index[fingerprint] = (variant_number, None)
+            continue
+        yield item
+        handed_out.append(fingerprint)
+        if len(handed_out) >= FLUSH_EVERY:
+            await _settle(handed_out)
+            handed_out = []
+    await _settle(handed_out)
+    await store.set_value(INDEX_KEY, None)
+
+
+async def _settle(fingerprints) -> None:
+    """Write the handed-out items to the dataset, then drop their records."""
+    await flush()
+    store = _variant_context["store"]
+    index = _variant_context["index"]
+    for fingerprint in fingerprints:
+        variant_number, key = index[fingerprint]
+        index[fingerprint] = (variant_number, None)
+        await store.set_value(key, None)
+
+
+async def _save_index(_event_data=None) -> None:
+    index = [[list(fingerprint), variant_number, key]
+             for fingerprint, (variant_number, key) in _variant_context["index"].items()]
+    await _variant_context["store"].set_value(INDEX_KEY, {"index": index, "claimed": _variant_context["claimed"]})
+
+
+def _fingerprint_key(fingerprint: tuple) -> str:
+    return '\x1f'.join(str(part) for part in fingerprint)
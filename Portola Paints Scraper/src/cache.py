@@ -0,0 +1,144 @@
+"""Persistent HTTP response cache kept in a named key-value store.
+
+Successful GET responses are stored gzip-compressed together with their `ETag` / `Last-Modified` validators, so
+the next run can revalidate them with `If-None-Match` / `If-Modified-Since` and reuse the stored body on a
+`304 Not Modified`. Entries younger than `http_cache_ttl` seconds are served without any request. An index record
+tracks entry sizes and last use; at the end of the run entries older than `http_cache_max_age` are dropped and the
+least recently used ones are evicted until the store fits in `http_cache_max_bytes`.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import time
+
+from apify import Actor
+from httpx import Request, Response
+
+INDEX_KEY = 'INDEX'
+STORED_HEADERS = ('content-type', 'etag', 'last-modified')
+
+_cache_context = {
+    "store": None,
+    "index": {},
+    "options": {
+        "http_cache": True,
+        "http_cache_ttl": 0.0,
+        "http_cache_max_age": 7 * 24 * 3600.0,
+        "http_cache_max_bytes": 256 * 1024 * 1024,
+    },
+}
+
+
+async def open_cache(actor_input: dict, store_name: str | None) -> None:
+    options = _cache_context["options"]
+    for key in options:
+        if actor_input.get(key) is not None:
+            options[key] = type(options[key])(actor_input[key])
+    if not options["http_cache"] or not store_name:
+        return
+    store = await Actor.open_key_value_store(name=store_name)
+    _cache_context["store"] = store
+    _cache_context["index"] = await store.get_value(INDEX_KEY) or {}
+
+
+async def close_cache() -> None:
+    store = _cache_context["store"]
+    if store is None:
+        return
+    await _evict()
+    await store.set_value(INDEX_KEY, _cache_context["index"])
+    _cache_context["store"] = None
+
+
+async def lookup_cached(request: Request) -> tuple[dict, Response | None] | None:
+    """Return the index entry for a cacheable request and, when it is still fresh, the cached response."""
+    if _cache_context["store"] is None or request.method != 'GET':
+        return None
+    entry = _cache_context["index"].get(_cache_key(request))
+    if entry is None:
+        return None
+    if time.time() - entry["stored_at"] < _cache_context["options"]["http_cache_ttl"]:
+        response = await _load(request, entry)
+        if response is not None:
+            return entry, response
+    if entry.get("etag"):
+        request.headers['If-None-Match'] = entry["etag"]
+    if entry.get("last_modified"):
+        request.headers['If-Modified-Since'] = entry["last_modified"]
+    return entry, None
+
+
+async def store_response(request: Request, response: Response, entry: dict | None) -> Response:
+    """Save a fresh 200 response, or turn a 304 for a cached entry back into the stored 200 response.
+
+    A 304 is returned as it is when the stored body can no longer be read; see `forget_cached()`.
+    """
+    if _cache_context["store"] is None or request.method != 'GET':
+        return response
+    if response.status_code == 304 and entry is not None:
+        cached = await _load(request, entry)
+        if cached is not None:
+            entry["stored_at"] = time.time()
+            return cached
+    if response.status_code != 200:
+        return response
+    headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+    if 'etag' not in headers and 'last-modified' not in headers and not _cache_context["options"]["http_cache_ttl"]:
+        return response
+    body = gzip.compress(response.content)
+    key = _cache_key(request)
+    await _cache_context["store"].set_value(key, body, content_type='application/octet-stream')
+    _cache_context["index"][key] = {
+        "url": str(request.url),
+        "size": len(body),
+        "stored_at": time.time(),
+        "used_at": time.time(),
+        "etag": headers.get('etag'),
+        "last_modified": headers.get('last-modified'),
+        "headers": headers,
+    }
+    return response
+
+
+def _cache_key(request: Request) -> str:
+    return hashlib.sha256(str(request.url).encode('utf-8')).hexdigest()[:40]
+
+
+async def forget_cached(request: Request) -> None:
+    """Drop the entry of a request whose stored body is gone, and the validators it added to the request."""
+    _cache_context["index"].pop(_cache_key(request), None)
+    await _cache_context["store"].set_value(_cache_key(request), None)
+    request.headers.pop('If-None-Match', None)
+    request.headers.pop('If-Modified-Since', None)
+
+
+async def _load(request: Request, entry: dict) -> Response | None:
+    body = await _cache_context["store"].get_value(_cache_key(request))
+    try:
+        content = gzip.decompress(body) if body is not None else None
+    except (OSError, EOFError, TypeError):
+        Actor.log.warning(f'Dropping an unreadable cache entry for {request.url}.')
+        content = None
+    if content is None:
+        _cache_context["index"].pop(_cache_key(request), None)
+        return None
+    entry["used_at"] = time.time()
+    return Response(200, headers=entry["headers"], content=content, request=request)
+
+
+async def _evict() -> None:
+    options = _cache_context["options"]
+    index = _cache_context["index"]
+    now = time.time()
+    expired = {key for key, entry in index.items() if now - entry["stored_at"] > options["http_cache_max_age"]}
+    total = sum(entry["size"] for key, entry in index.items() if key not in expired)
+    for key in sorted(set(index) - expired, key=lambda k: index[k]["used_at"]):
+        if total <= options["http_cache_max_bytes"]:
+            break
+        expired.add(key)
+        total -= index[key]["size"]
+    for key in expired:
+        await _cache_context["store"].set_value(key, None)
+        index.pop(key, None)
@@ -10,15 +10,19 @@ from __future__ import annotations
 from urllib.parse import urljoin
 from lxml import html
 import re
-from bs4 import BeautifulSoup
-import gzip
-import base64
-import requests
 from apify import Actor
-from httpx import AsyncClient
-import json
 from datetime import datetime
 
+from .dataset import dataset_writer
+from .executor import cpu_pool, run_cpu
+from .http_client import fetch, http_session
+from .incremental import content_fingerprint, incremental_run, product_unchanged
+from .page import encode_raw_text, page_text, parse_page
+from .pipeline import emit, enqueue, product_pipeline
+from .product_json import product_json, product_json_for_url
+from .shopify import (collection_products, product_description, product_fingerprint, product_images,
+                      shopify_product_url)
+
 _run_context = {
     "counter": 0  # MUST be an integer, not None
 }
@@ -38,11 +42,10 @@ async def generate_source_run_id():
 
 
 async def fetch_html(url: str) -> str:
-    async with AsyncClient() as client:
-        Actor.log.info(f"Fetching: {url}")
-        response = await client.get(url, follow_redirects=False)
-        if response.status_code == 200:
-            return response.text
+    Actor.log.info(f"Fetching: {url}")
+    response = await fetch(url, follow_redirects=False)
+    if response.status_code == 200:
+        return response.text
 
 
 async def main() -> None:
@@ -53,7 +56,14 @@ async def main() -> None:
     the field of web scraping significantly.
     """
     # Enter the context of the Actor.
-    async with Actor:
+    async with (
+        Actor,
+        http_session(cache_store='portolapaints-http-cache'),
+        cpu_pool(),
+        dataset_writer(),
+        incremental_run('portolapaints-incremental'),
+        product_pipeline(process_link_url),
+    ):
         # Retrieve the Actor input, and use default values if not provided.
         actor_input = await Actor.get_input() or {}
         start_urls = actor_input.get('start_urls', [
@@ -69,43 +79,40 @@ async def main() -> None:
 
         # Enqueue the start URLs with an initial crawl depth of 0.
         for start_url in start_urls:
+            products = await collection_products(start_url)
+            if products is not None:
+                for product in products:
+                    await enqueue(shopify_product_url(start_url, product, in_collection=True), product)
+                continue
             All_Link = []
             page = 1
             while True:
-                # Create an HTTPX client to fetch the HTML content of the URLs.
-                async with AsyncClient() as client:
-                    try:
-                        # Fetch the HTTP response from the specified URL using HTTPX.
-                        response = await client.get(start_url, follow_redirects=True)
+                try:
+                    # Fetch the HTTP response from the specified URL using HTTPX.
+                    response = await fetch(start_url, follow_redirects=True)
 
-                        tree = html.fromstring(response.text)
+                    tree = html.fromstring(response.text)
 
-                        all_links = tree.xpath('//div[@class="productItem__wrapper"]/a/@href')
-                        if len(All_Link) == len(all_links):
-                            break
-                        for link in all_links:
-                            link_url = urljoin('https://portolapaints.com', link)
+                    all_links = tree.xpath('//div[@class="productItem__wrapper"]/a/@href')
+                    if len(All_Link) == len(all_links):
+                        break
+                    for link in all_links:
+                        link_url = urljoin('https://portolapaints.com', link)
 
-                            if link_url.startswith(('http://', 'https://')):
-                                All_Link.append(link)
-                                await process_link_url(link_url)
-                        page += 1
-                    except Exception:
-                        Actor.log.exception(f'Cannot extract data from {start_url}.')
+                        if link_url.startswith(('http://', 'https://')):
+                            All_Link.append(link)
+                            await enqueue(link_url)
+                    page += 1
+                except Exception:
+                    Actor.log.exception(f'Cannot extract data from {start_url}.')
 
 
-async def process_link_url(product_url: str):
-    content_html = await fetch_html(product_url)
-    if not content_html:
-        Actor.log.info(f"Response Not Found: {product_url}")
-        return
-    soup = BeautifulSoup(content_html, 'html.parser')
-    visible_text = soup.get_text(strip=True)
-    compressed = gzip.compress(visible_text.encode('utf-8'))
-    raw_text = base64.b64encode(compressed).decode('utf-8')
-    tree = html.fromstring(content_html)
-    description = ''.join(tree.xpath('//meta[@name="description"]/@content')).strip().replace(' ', ' ').replace('\n',
-                                                                                                                ' ').strip()
+def page_fields(tree) -> dict:
+    """Read what products.json does not have: the spec tabs and the color notes of the product page.
+
+    The spec tabs give, per finish, the recommended usage, sheen, coverage, dry to touch and recoat times,
+    application and formulation; the first paragraph under them stands in for a missing recommended usage.
+    """
     keys = []
     nav_elements = tree.xpath('//header/following-sibling::div/nav/p/text()')
     for nav_element in nav_elements:
@@ -128,19 +135,44 @@ async def process_link_url(product_url: str):
         value[-2] = application
         nav_data = dict(zip(key, value))
         nav_data_list.append(nav_data)
-    key_data = dict(zip(keys, nav_data_list))
+    color_note = ''.join(
+        tree.xpath("(//em[text()='Color Notes:'])[1]/parent::span/following-sibling::text()")).strip()
+    if not color_note:
+        color_note = ''.join(tree.xpath(
+            "(//em[text()='Color Notes:'])[1]/parent::span/parent::span/following-sibling::span/text()")).strip()
+    return {
+        "specs": dict(zip(keys, nav_data_list)),
+        "application_note": ''.join(tree.xpath(
+            '(//header/following-sibling::div/nav/following-sibling::div//div[@class="rte comman_paragrap"]/p/text())[1]')),
+        "color_note": color_note or None,
+    }
 
-    try:
-        variant_json_string = \
-            ''.join(tree.xpath('//script[@id="web-pixels-manager-setup"]/text()')).strip().split('productVariants":')[
-                1].split(
-                '],')[0].strip() + ']'
-    except:
-        variant_json_string = None
-    variants = json.loads(variant_json_string)
+
+async def process_link_url(product_url: str, product: dict | None = None):
+    if product is not None and await product_unchanged(product_url, product_fingerprint(product)):
+        return
+    content_html = await fetch_html(product_url)
+    if not content_html:
+        Actor.log.info(f"Response Not Found: {product_url}")
+        return
+    tree = await run_cpu(parse_page, content_html)
+    visible_text = await run_cpu(page_text, tree)
+    if product is None and await product_unchanged(product_url, content_fingerprint(visible_text)):
+        return
+    raw_text = await run_cpu(encode_raw_text, visible_text)
+    if product is None:
+        # Listed from the collection page: the title, variants and description come from the product's JSON.
+        product = await product_json_for_url(product_url)
+        if product is None:
+            Actor.log.info(f"Product JSON Not Found: {product_url}")
+            return
+    fields = await run_cpu(page_fields, tree)
+    description = (product_description(product) or '').replace('\xa0', ' ').replace('\n', ' ').strip()
+    key_data = fields['specs']
+    product_name = product['title'].strip()
+    variants = product['variants']
     for variant in variants:
         variant_id = variant['id']
-        product_name = variant['product']['title'].strip()
         variant_name = variant['title']
         specification_name = ''
         if '5/60 Flat' in variant_name:
@@ -190,8 +222,7 @@ async def process_link_url(product_url: str):
                        "formulation": formulation}
         useCase = performance['recommendedUsage']
         if not useCase:
-            useCase_ = ''.join(tree.xpath(
-                '(//header/following-sibling::div/nav/following-sibling::div//div[@class="rte comman_paragrap"]/p/text())[1]'))
+            useCase_ = fields['application_note']
             if 'can be applied to' in useCase_:
                 useCase = []
                 useCase__ = useCase_.split('can be applied to')[1]
@@ -219,42 +250,19 @@ async def process_link_url(product_url: str):
         vendor = "Portola Paints"
         category = "Wall Finishes"
         subcategory = "Paint"
-        variant_price = variant['price']['amount']
+        variant_price = float(variant['price'])
         Color = product_name
         if 'Flat' in variant_name:
             finish = variant_name.split('(')[0].strip()
         else:
             finish = variant_name.split('/')[0].strip().split('(')[0]
         url = urljoin(product_url, f'?variant={variant_id}')
-        color_note = ''.join(
-            tree.xpath("(//em[text()='Color Notes:'])[1]/parent::span/following-sibling::text()")).strip()
-        if not color_note:
-            color_note = ''.join(tree.xpath(
-                "(//em[text()='Color Notes:'])[1]/parent::span/parent::span/following-sibling::span/text()")).strip()
-        if not color_note:
-            color_note = None
+        color_note = fields['color_note']
         additionalData = {
             "priceUnit": f"per {unit}",
             "colorNotes": color_note,
             "raw_text": raw_text
         }
-        headers = {
-            'accept': 'application/json, text/javascript, */*; q=0.01',
-            'accept-language': 'en-GB,en-US;q=0.9,en;q=0.8,hi;q=0.7',
-            'priority': 'u=1, i',
-            'sec-ch-ua': '"Chromium";v="136", "Google Chrome";v="136", "Not.A/Brand";v="99"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"Windows"',
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-origin',
-            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36',
-            'x-requested-with': 'XMLHttpRequest',
-        }
-
-        params = {
-            '_': '1748427774749',
-        }
         product_name_for_tags = ''
         if 'Roman Clay' in variant_name:
             product_name_for_tags = f"{product_name.lower().replace(' ', '-')}-roman-clay"
@@ -263,24 +271,13 @@ async def process_link_url(product_url: str):
         if not 'Roman Clay' in variant_name and not 'Lime Wash' in variant_name:
             product_name_for_tags = f"{product_name.lower().replace(' ', '-')}-acrylic"
 
-        response_tags = requests.get(f'https://portolapaints.com/products/{product_name_for_tags}.json', params=params,
-                                     headers=headers, )
-        if response_tags.status_code != 200:
-            product_name_for_tags = product_url.split('/')[-1].strip()
-            response_tags = requests.get(f'https://portolapaints.com/products/{product_name_for_tags}.json',
-                                         params=params,
-                                         headers=headers, )
-        if response_tags.status_code == 200:
-            content_for_tags = json.loads(response_tags.text)
-            collection = content_for_tags['product']['product_type'].strip()
-            images = content_for_tags['product']['images']
-            images_link = []
-            for img in images:
-                src = img['src']
-                images_link.append(src)
+        # The finish's own product carries the collection and images; the listed product stands in when there is none.
+        if product_name_for_tags == product.get('handle'):
+            content_for_tags = product
         else:
-            collection = None
-            images_link = None
+            content_for_tags = await product_json('https://portolapaints.com', product_name_for_tags) or product
+        collection = content_for_tags['product_type'].strip()
+        images_link = product_images(content_for_tags)
         variant_group = f"{product_name.replace(' ', '-').lower()}"
         item = {"id": product_id,
                 "name": name,
@@ -312,4 +309,4 @@ async def process_link_url(product_url: str):
                 "wasManuallyEdited": False,
                 "specifications": {"performance": performance},
                 "additionalData": additionalData}
-        await Actor.push_data(item)
+        await emit(item)
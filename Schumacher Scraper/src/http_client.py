@@ -0,0 +1,100 @@
+"""Run-scoped HTTP client shared by every request the Actor makes.
+
+Opening a new `AsyncClient` per request means a new DNS lookup, TCP connection and TLS handshake for every page.
+Instead one client is kept per host for the whole run, so connections are pooled and reused, and all of them are
+closed when the Actor exits. Requests made through `fetch()` also pass the per-host rate limiter, the shared
+retry policy and the persistent response cache.
+"""
+
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from apify import Actor
+from httpx import AsyncClient, Limits, Response
+
+from .cache import close_cache, forget_cached, lookup_cached, open_cache, store_response
+from .rate_limit import acquire, configure_rate_limits
+from .retry import configure_retries, with_retries
+
+_client_context = {
+    "clients": {},
+    "options": {
+        "max_connections_per_host": 20,
+        "max_keepalive_per_host": 10,
+        "keepalive_expiry": 30.0,
+        "http2": False,
+        "request_timeout": 30.0,
+    },
+}
+
+
+@asynccontextmanager
+async def http_session(rate_limits: dict | None = None, cache_store: str | None = None):
+    """Configure the shared clients from the Actor input and close them on exit.
+
+    Meant to be entered together with the Actor: `async with Actor, http_session():`. `rate_limits` holds the
+    vendor's per-host defaults; the `rate_limit` and `rate_limits` Actor input fields override them. `cache_store`
+    names the key-value store that keeps the response cache between runs.
+    """
+    actor_input = await Actor.get_input() or {}
+    options = _client_context["options"]
+    for key in options:
+        if actor_input.get(key) is not None:
+            options[key] = type(options[key])(actor_input[key])
+    await configure_rate_limits({**(rate_limits or {}), **(actor_input.get("rate_limits") or {})},
+                                default=actor_input.get("rate_limit"))
+    await configure_retries(actor_input)
+    await open_cache(actor_input, cache_store)
+    try:
+        yield
+    finally:
+        await close_clients()
+        await close_cache()
+
+
+async def get_client(url: str) -> AsyncClient:
+    """Return the pooled client for the host of `url`, creating it on first use."""
+    host = urlsplit(url).netloc.lower()
+    client = _client_context["clients"].get(host)
+    if client is None:
+        options = _client_context["options"]
+        limits = Limits(max_connections=options["max_connections_per_host"],
+                        max_keepalive_connections=options["max_keepalive_per_host"],
+                        keepalive_expiry=options["keepalive_expiry"])
+        client = AsyncClient(limits=limits, http2=options["http2"], timeout=options["request_timeout"])
+        _client_context["clients"][host] = client
+    return client
+
+
+async def fetch(url: str, method: str = "GET", follow_redirects: bool = False, **kwargs) -> Response:
+    """Send a request through the pooled client of the host, rate limited and retried on transient failures.
+
+    GET responses are served from, or revalidated against, the response cache.
+    """
+    client = await get_client(url)
+    request = client.build_request(method, url, **kwargs)
+    cached = await lookup_cached(request)
+    if cached is not None and cached[1] is not None:
+        return cached[1]
+
+    async def send() -> Response:
+        await acquire(url)
+        return await client.send(request, follow_redirects=follow_redirects)
+
+    entry = cached[0] if cached is not None else None
+    response = await store_response(request, await with_retries(url, send), entry)
+    if response.status_code == 304 and entry is not None:
+        # Revalidated, but the stored body was lost since the lookup: ask again without the validators.
+        await response.aclose()
+        await forget_cached(request)
+        response = await store_response(request, await with_retries(url, send), None)
+    return response
+
+
+async def close_clients() -> None:
+    clients = _client_context["clients"]
+    while clients:
+        _, client = clients.popitem()
+        await client.aclose()
@@ -8,16 +8,20 @@ https://docs.apify.com/sdk/python
 
 from __future__ import annotations
 
+import asyncio
 import re
-import time
 
-from lxml import html
 from datetime import datetime
 from apify import Actor
-from httpx import AsyncClient
 import json
-import gzip
-import base64
+from urllib.parse import urlsplit
+
+from .dataset import dataset_writer
+from .executor import cpu_pool, run_cpu
+from .http_client import fetch, http_session
+from .incremental import content_fingerprint, incremental_run, product_unchanged
+from .page import encode_raw_text, parse_page
+from .pipeline import emit, enqueue, product_pipeline
 
 headers = {
     'accept': '*/*',
@@ -38,6 +42,24 @@ headers = {
     'x-version': '1.2',
 }
 
+POLITE_RATE_LIMITS = {
+    "schumacher.com": {"rate": 2, "burst": 2, "jitter": 0.25},
+    # The catalog API was never throttled; its fan-out is bounded by catalog_concurrency instead.
+    "api.schumacher.com": {"rate": 0},
+}
+
+_next_data_context = {
+    "enabled": False,
+    "build_id": None,
+}
+
+# Rug families being emitted: item number -> a future of the claimant's outcome (True once emitted, False if
+# its page failed), and the claimant's URL -> (that future, the item numbers it claimed).
+_rug_family_context = {
+    "claims": {},
+    "owners": {},
+}
+
 _run_context = {
     "counter": 0  # MUST be an integer, not None
 }
@@ -57,23 +79,10 @@ async def generate_source_run_id():
 
 
 async def fetch_html(url: str) -> str:
-    while True:
-        try:
-            async with AsyncClient() as client:
-                Actor.log.info(f"Fetching: {url}")
-                response = await client.get(url, follow_redirects=False, timeout=30)
-                if response.status_code == 200:
-                    return response.text
-        except:
-            time.sleep(2)
-            try:
-                async with AsyncClient() as client:
-                    Actor.log.info(f"Fetching: {url}")
-                    response = await client.get(url, follow_redirects=False, timeout=30)
-                    if response.status_code == 200:
-                        return response.text
-            except:
-                pass
+    Actor.log.info(f"Fetching: {url}")
+    response = await fetch(url, follow_redirects=False, timeout=30)
+    if response.status_code == 200:
+        return response.text
 
 
 async def main() -> None:
@@ -84,7 +93,14 @@ async def main() -> None:
     the field of web scraping significantly.
     """
     # Enter the context of the Actor.
-    async with Actor:
+    async with (
+        Actor,
+        http_session(rate_limits=POLITE_RATE_LIMITS, cache_store='schumacher-http-cache'),
+        cpu_pool(),
+        dataset_writer(),
+        incremental_run('schumacher-incremental'),
+        product_pipeline(handle_link_url),
+    ):
         # Retrieve the Actor input, and use default values if not provided.
         actor_input = await Actor.get_input() or {}
         start_urls = actor_input.get("url", [
@@ -98,54 +114,98 @@ async def main() -> None:
             Actor.log.info('No start URLs specified in Actor input, exiting...')
             await Actor.exit()
 
-        # Enqueue the start URLs with an initial crawl depth of 0.
-        for start_url in start_urls:
-            categoryId = start_url.split('?')[0].split('/')[-1].strip()
-            if categoryId == "1":
-                category = "Wall Finishes"
-            elif categoryId == "2":
-                category = "Fabrics"
-            else:
-                category = "Rugs"
-            page = 0
-            while True:
-                params = {
-                    'sort': [
-                        'bestSellerSG,desc',
-                        'itemNumber,desc',
-                    ],
-                    'size': '24',
-                    'page': f'{page}',
-                    'hasImage': 'true',
-                    'skipAnalytics': 'false',
-                    'categoryId': categoryId,
-                    'gridSize': 'lg',
-                    '_rv': 'false',
-                }
-                url = 'https://api.schumacher.com/catalog/entries'
-                # Create an HTTPX client to fetch the HTML content of the URLs.
-                async with AsyncClient() as client:
-                    try:
-                        # Fetch the HTTP response from the specified URL using HTTPX.
-                        response = await client.get(url, follow_redirects=True, params=params, headers=headers,
-                                                    timeout=30)
+        _next_data_context["enabled"] = bool(actor_input.get("next_data", False))
 
-                        tree = json.loads(response.text)
+        # Enqueue the start URLs with an initial crawl depth of 0. Every category is listed at the same time.
+        page_size = int(actor_input.get("catalog_page_size", 24))
+        concurrency = max(1, int(actor_input.get("catalog_concurrency", 4)))
+        await asyncio.gather(*(list_category(start_url, page_size, concurrency) for start_url in start_urls))
 
-                        all_content = tree['content']
-                        if not all_content:
-                            break
-                        for content in all_content:
-                            variations = content['variations']
-                            for variation in variations:
-                                itemNumber = variation['itemNumber']
-                                link_url = f"https://schumacher.com/catalog/products/{itemNumber}"
-                                if link_url.startswith(('http://', 'https://')):
-                                    await process_link_url(link_url, category)
-                        page += 1
 
-                    except Exception:
-                        Actor.log.exception(f'Cannot extract data from {start_url} at page {page} url {link_url}.')
+async def list_category(start_url: str, page_size: int, concurrency: int) -> None:
+    """Enqueue every product of a catalog category.
+
+    The first page gives `totalPages`; the other pages are then requested concurrently, at most `concurrency` at a
+    time for this category, and their products are enqueued in the order the pages arrive.
+    """
+    categoryId = start_url.split('?')[0].split('/')[-1].strip()
+    if categoryId == "1":
+        category = "Wall Finishes"
+    elif categoryId == "2":
+        category = "Fabrics"
+    else:
+        category = "Rugs"
+    try:
+        first = await catalog_page(categoryId, 0, page_size)
+        await enqueue_entries(first, category)
+        total_pages = first.get('totalPages')
+        if total_pages is not None:
+            total_pages = int(total_pages)
+    except Exception:
+        Actor.log.exception(f'Cannot extract data from {start_url} at page 0.')
+        return
+    if total_pages is None:
+        # No page count in the response: walk the pages one after another until one comes back empty.
+        page = 1
+        while True:
+            try:
+                tree = await catalog_page(categoryId, page, page_size)
+                if not tree['content']:
+                    return
+                await enqueue_entries(tree, category)
+            except Exception:
+                Actor.log.exception(f'Cannot extract data from {start_url} at page {page}.')
+                return
+            page += 1
+    Actor.log.info(f'Listing {total_pages} pages of {start_url}.')
+    slots = asyncio.Semaphore(concurrency)
+
+    async def load(page):
+        async with slots:
+            try:
+                return page, await catalog_page(categoryId, page, page_size)
+            except Exception:
+                Actor.log.exception(f'Cannot extract data from {start_url} at page {page}.')
+                return page, None
+
+    for task in asyncio.as_completed([asyncio.create_task(load(page)) for page in range(1, total_pages)]):
+        page, tree = await task
+        if tree is None:
+            continue
+        try:
+            await enqueue_entries(tree, category)
+        except Exception:
+            Actor.log.exception(f'Cannot extract data from {start_url} at page {page}.')
+
+
+async def catalog_page(categoryId: str, page: int, page_size: int) -> dict:
+    params = {
+        'sort': [
+            'bestSellerSG,desc',
+            'itemNumber,desc',
+        ],
+        'size': f'{page_size}',
+        'page': f'{page}',
+        'hasImage': 'true',
+        'skipAnalytics': 'false',
+        'categoryId': categoryId,
+        'gridSize': 'lg',
+        '_rv': 'false',
+    }
+    url = 'https://api.schumacher.com/catalog/entries'
+    # Fetch the HTTP response from the specified URL using HTTPX.
+    response = await fetch(url, follow_redirects=True, params=params, headers=headers, timeout=30)
+    return json.loads(response.text)
+
+
+async def enqueue_entries(tree: dict, category: str) -> None:
+    for content in tree['content']:
+        variations = content['variations']
+        for variation in variations:
+            itemNumber = variation['itemNumber']
+            link_url = f"https://schumacher.com/catalog/products/{itemNumber}"
+            if link_url.startswith(('http://', 'https://')):
+                await enqueue(link_url, category)
 
 
 async def parse_materials(material_str):
@@ -166,19 +226,116 @@ async def parse_materials(material_str):
     return result
 
 
+async def product_json(product_url: str) -> tuple[str, dict] | None:
+    """Return the Next.js page JSON of a product as text and parsed (`{"props": {"pageProps": ...}}`), or None.
+
+    With `next_data` set in the Actor input, products are read from `/_next/data/<buildId>/...json`, which is the
+    page props alone, once the build ID is known from a product page. A 404 there, usually a new deployment, falls
+    back to the HTML page, which also brings the new build ID.
+    """
+    build_id = _next_data_context["build_id"]
+    if _next_data_context["enabled"] and build_id:
+        data_url = f'https://schumacher.com/_next/data/{build_id}{urlsplit(product_url).path}.json'
+        Actor.log.info(f"Fetching: {data_url}")
+        response = await fetch(data_url, follow_redirects=False, headers={'x-nextjs-data': '1'}, timeout=30)
+        if response.status_code == 200:
+            try:
+                data = json.loads(response.text)
+            except ValueError:
+                data = None
+            if data and 'ssrProduct' in (data.get('pageProps') or {}):
+                return response.text, {"props": data}
+        Actor.log.info(f'No Next.js data for {product_url} in build {build_id}, fetching the page instead.')
+    content_html = await fetch_html(product_url)
+    if not content_html:
+        return None
+    tree = await run_cpu(parse_page, content_html)
+    json_text = ''.join(tree.xpath('//script[@type="application/json"]/text()')).strip()
+    json_content = json.loads(json_text)
+    page_build_id = json_content.get('buildId')
+    if page_build_id and page_build_id != _next_data_context["build_id"]:
+        Actor.log.info(f'Next.js build {page_build_id} found on {product_url}.')
+        _next_data_context["build_id"] = page_build_id
+    return json_text, json_content
+
+
+async def rug_size(ssrProduct: dict):
+    check_for_attribute = ssrProduct['relatedProducts'][0]['attributes']
+    check_for_variant = None
+    for attr in check_for_attribute:
+        attr_name = attr['name']
+        if attr_name == 'Size':
+            check_for_variant = attr['value'][0]['value']
+    return check_for_variant
+
+
+async def claim_rug_family(product_url: str, ssrProduct: dict) -> bool:
+    """Claim a rug and every related rug its page emits items for; False if a sibling already holds the claim.
+
+    The listing enqueues every item number of a rug family, but one page emits the whole family: all related
+    products for non-standard sizes, otherwise the size variations. The claim is settled by `settle_rug_family`.
+    """
+    claims = _rug_family_context["claims"]
+    item_number = product_url.rstrip('/').split('/')[-1]
+    if item_number in claims:
+        return False
+    non_standard = await rug_size(ssrProduct) == 'Non-Standard'
+    family = {item_number} | {
+        variant['itemNumber'] for variant in ssrProduct['relatedProducts']
+        if non_standard or variant['relationshipType'].upper() == 'SIZE_VARIATION'} - claims.keys()
+    claim = asyncio.get_running_loop().create_future()
+    claims.update(dict.fromkeys(family, claim))
+    _rug_family_context["owners"][product_url] = (claim, family)
+    return True
+
+
+def settle_rug_family(product_url: str, emitted: bool):
+    """Resolve the claim `product_url` holds, if any; a failed claimant releases its rugs to their own pages."""
+    owner = _rug_family_context["owners"].pop(product_url, None)
+    if owner is None:
+        return
+    claim, family = owner
+    if not emitted:
+        for item_number in family:
+            del _rug_family_context["claims"][item_number]
+    claim.set_result(emitted)
+
+
+async def rug_family_emitted(item_number: str) -> bool:
+    """Whether a sibling's page emitted this rug, waiting for that page while it is still being handled."""
+    claim = _rug_family_context["claims"].get(item_number)
+    return claim is not None and await asyncio.shield(claim)
+
+
+async def handle_link_url(product_url: str, category: str):
+    emitted = False
+    try:
+        await process_link_url(product_url, category)
+        emitted = True
+    finally:
+        settle_rug_family(product_url, emitted)
+
+
 async def process_link_url(product_url: str, category: str):
-    time.sleep(1)
     if category == "Rugs":
-        content_html = await fetch_html(product_url)
-        if not content_html:
+        # Most size variations are dequeued after a sibling's page has claimed them; skip those before fetching.
+        item_number = product_url.rstrip('/').split('/')[-1]
+        if await rug_family_emitted(item_number):
+            Actor.log.info(f'Already emitted with its size variations, skipping: {product_url}')
+            return
+        page = await product_json(product_url)
+        if page is None:
             Actor.log.info(f"Response Not Found: {product_url}")
             return
-        tree = html.fromstring(content_html)
-        json_text = ''.join(tree.xpath('//script[@type="application/json"]/text()')).strip()
-        compressed = gzip.compress(json_text.encode('utf-8'))
-        raw_text = base64.b64encode(compressed).decode('utf-8')
-        json_content = json.loads(json_text)
+        json_text, json_content = page
         ssrProduct = json_content['props']['pageProps']['ssrProduct']
+        while not await claim_rug_family(product_url, ssrProduct):
+            if await rug_family_emitted(item_number):
+                Actor.log.info(f'Already emitted with its size variations, skipping: {product_url}')
+                return
+        if await product_unchanged(product_url, content_fingerprint(json.dumps(ssrProduct, sort_keys=True))):
+            return
+        raw_text = await run_cpu(encode_raw_text, json_text)
         product_name = ssrProduct['name'].strip().title()
         variantGroup = product_name.lower().replace(' ', '-').replace('/', '-')
         colorName = ssrProduct['colorName'].strip().title()
@@ -249,12 +406,7 @@ async def process_link_url(product_url: str, category: str):
             composition = await parse_materials(material)
         else:
             composition = []
-        check_for_attribute = ssrProduct['relatedProducts'][0]['attributes']
-        check_for_variant = None
-        for attr in check_for_attribute:
-            attr_name = attr['name']
-            if attr_name == 'Size':
-                check_for_variant = attr['value'][0]['value']
+        check_for_variant = await rug_size(ssrProduct)
         if check_for_variant == 'Non-Standard':
             variants = ssrProduct['relatedProducts']
             for variant in variants:
@@ -332,7 +484,7 @@ async def process_link_url(product_url: str, category: str):
                     "wasManuallyEdited": False,
                     "additionalData": additionalData
                 }
-                await Actor.push_data(item)
+                await emit(item)
         else:
             variants = ssrProduct['relatedProducts']
             for variant in variants:
@@ -413,19 +565,18 @@ async def process_link_url(product_url: str, category: str):
                         "wasManuallyEdited": False,
                         "additionalData": additionalData
                     }
-                    await Actor.push_data(item)
+                    await emit(item)
 
     if category == "Wall Finishes" or category == "Fabrics":
-        content_html = await fetch_html(product_url)
-        if not content_html:
+        page = await product_json(product_url)
+        if page is None:
             Actor.log.info(f"Response Not Found: {product_url}")
             return
-        tree = html.fromstring(content_html)
-        json_text = ''.join(tree.xpath('//script[@type="application/json"]/text()')).strip()
-        compressed = gzip.compress(json_text.encode('utf-8'))
-        raw_text = base64.b64encode(compressed).decode('utf-8')
-        json_content = json.loads(json_text)
+        json_text, json_content = page
         ssrProduct = json_content['props']['pageProps']['ssrProduct']
+        if await product_unchanged(product_url, content_fingerprint(json.dumps(ssrProduct, sort_keys=True))):
+            return
+        raw_text = await run_cpu(encode_raw_text, json_text)
         try:
             product_name = ssrProduct['name'].strip().title()
         except:
@@ -660,4 +811,4 @@ async def process_link_url(product_url: str, category: str):
             "additionalData": additionalData
         }
 
-        await Actor.push_data(item)
+        await emit(item)
@@ -0,0 +1,81 @@
+"""Parse a product page once with lxml and derive everything the handlers need from that one tree.
+
+The handlers used to build a `BeautifulSoup(content_html, 'html.parser')` tree only to call `get_text(strip=True)`
+for `raw_text`, and then parse the same HTML again with lxml for the XPath work. `page_text()` rebuilds that text
+from the lxml tree: every text node outside `script`, `style`, `template`, `rt` and `rp`, stripped and joined in
+document order without a separator. Comments, processing instructions and the doctype are skipped as well.
+
+The two parsers do not build the same tree from every input, so the text can still differ from BeautifulSoup's:
+
+- html.parser ends a string at every tag, including a stray end tag it then ignores, and each piece is stripped;
+  libxml2 drops the stray tag and keeps one text node, so whitespace around it survives (`x </p> y` gives `x  y`
+  instead of `xy`).
+- `<![CDATA[...]]>` sections in HTML are dropped by libxml2; html.parser keeps their text.
+- The content of `<textarea>` and `<plaintext>` is raw text to libxml2 and markup to html.parser; it is parsed
+  again here, but by then libxml2 has decoded its entities, so escaped markup (`&lt;b&gt;`) is read as a tag.
+
+`tests/test_page.py` compares both on the pages in `tests/fixtures/pages`.
+"""
+
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+
+from lxml import html
+
+# BeautifulSoup stores the strings inside these tags as Script, Stylesheet, TemplateString, RubyTextString and
+# RubyParenthesisString, which get_text() leaves out.
+_HIDDEN_TEXT_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+# libxml2 keeps the content of these as raw text, where html.parser reads it as markup.
+_RAW_TEXT_TAGS = {'textarea', 'plaintext'}
+
+
+def parse_page(content_html: str):
+    return html.fromstring(content_html)
+
+
+def page_text(tree) -> str:
+    """Return the text `BeautifulSoup(content_html, 'html.parser').get_text(strip=True)` gives for the page."""
+    parts = []
+    root = tree.getroottree().getroot()
+    # libxml2 keeps text found after </html> in a sibling of the root element.
+    for element in [root, *root.itersiblings()]:
+        if isinstance(element.tag, str):
+            _collect_text(element, parts)
+    return ''.join(parts)
+
+
+def fragment_text(fragment: str) -> str:
+    """Same as `page_text()` for a snippet of HTML, such as one line of a product description."""
+    parts = []
+    _collect_text(html.fragment_fromstring(fragment, create_parent='div'), parts)
+    return ''.join(parts)
+
+
+def embedded_json(tree, xpath: str):
+    """Load the JSON held in the first node matched by `xpath`, e.g. `//script[@id="__NEXT_DATA__"]/text()`."""
+    nodes = tree.xpath(xpath)
+    if not nodes:
+        return None
+    return json.loads(nodes[0])
+
+
+def _collect_text(element, parts: list) -> None:
+    # Comments and processing instructions have no string tag; only their tail is page text.
+    if element.text:
+        parts.append(element.text.strip())
+    for child in element:
+        if child.tag in _RAW_TEXT_TAGS:
+            if child.text:
+                _collect_text(html.fragment_fromstring(child.text, create_parent='div'), parts)
+        elif isinstance(child.tag, str) and child.tag not in _HIDDEN_TEXT_TAGS:
+            _collect_text(child, parts)
+        if child.tail:
+            parts.append(child.tail.strip())
+
+
+def encode_raw_text(text: str) -> str:
+    # No timestamp in the gzip header, so the same text always encodes to the same string.
+    return base64.b64encode(gzip.compress(text.encode('utf-8'), mtime=0)).decode('utf-8')
@@ -0,0 +1,61 @@
+"""Thread pool for the CPU-heavy steps of the product handlers.
+
+Parsing a product page, walking it for the visible text and gzip/base64-encoding that text used to run on the event
+loop, so while one product was being parsed no response was read for any other. `run_cpu()` runs such a step on a
+pool sized to the cores the container may use (or `cpu_workers` from the Actor input) and hands the result back to
+the handler. lxml parses and zlib compresses without holding the GIL, so those steps really run in parallel; the
+pure-Python parts at least stop blocking the network tasks. Threads rather than processes because lxml trees
+cannot be sent between processes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from apify import Actor
+
+_executor_context = {
+    "pool": None,
+}
+
+
+@asynccontextmanager
+async def cpu_pool():
+    """Start the pool for as long as the context is open."""
+    actor_input = await Actor.get_input() or {}
+    workers = int(actor_input.get("cpu_workers") or available_cpus())
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cpu')
+    _executor_context["pool"] = pool
+    Actor.log.info(f'Running parsing and compression on {workers} worker threads.')
+    try:
+        yield
+    finally:
+        _executor_context["pool"] = None
+        pool.shutdown(wait=True)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run `func(*args, **kwargs)` on the CPU pool and return its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor_context["pool"], functools.partial(func, *args, **kwargs))
+
+
+def available_cpus() -> int:
+    """Cores this process may use, taking the CPU affinity and a cgroup v2 CPU quota into account."""
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
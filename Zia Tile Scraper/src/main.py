@@ -7,19 +7,31 @@ https://docs.apify.com/sdk/python
 """
 
 from __future__ import annotations
-import time
 from urllib.parse import urljoin
-from lxml import html
-from bs4 import BeautifulSoup
-import gzip
-import base64
+import re
 from datetime import datetime
 from apify import Actor
-from httpx import AsyncClient
 import json
 
+from .dataset import dataset_writer
+from .executor import cpu_pool, run_cpu
+from .http_client import fetch, http_session
+from .incremental import content_fingerprint, incremental_run, previous_fingerprint, product_unchanged
+from .next_data import next_page_props, page_props_fingerprint, stream_next_data
+from .page import encode_raw_text, page_text, parse_page
+from .pipeline import emit, enqueue, product_pipeline
+from .shopify import (collection_products, product_description, product_fingerprint, product_images,
+                      shopify_product_url)
+
+POLITE_RATE_LIMITS = {
+    "ziatile.com": {"rate": 2, "burst": 2, "jitter": 0.25},
+}
+
+_TILE_POSITION = re.compile(r'<div\b[^>]*\bdata-position="(\d+)"')
+
 _run_context = {
-    "counter": 0  # MUST be an integer, not None
+    "counter": 0,  # MUST be an integer, not None
+    "next_data": False,
 }
 
 
@@ -37,11 +49,10 @@ async def generate_source_run_id():
 
 
 async def fetch_html(url: str) -> str:
-    async with AsyncClient() as client:
-        Actor.log.info(f"Fetching: {url}")
-        response = await client.get(url, follow_redirects=False)
-        if response.status_code == 200:
-            return response.text
+    Actor.log.info(f"Fetching: {url}")
+    response = await fetch(url, follow_redirects=False)
+    if response.status_code == 200:
+        return response.text
 
 
 async def main() -> None:
@@ -52,7 +63,14 @@ async def main() -> None:
     the field of web scraping significantly.
     """
     # Enter the context of the Actor.
-    async with Actor:
+    async with (
+        Actor,
+        http_session(rate_limits=POLITE_RATE_LIMITS, cache_store='ziatile-http-cache'),
+        cpu_pool(),
+        dataset_writer(),
+        incremental_run('ziatile-incremental'),
+        product_pipeline(process_link_url),
+    ):
         # Retrieve the Actor input, and use default values if not provided.
         actor_input = await Actor.get_input() or {}
         start_urls = actor_input.get('start_urls', [
@@ -65,6 +83,7 @@ async def main() -> None:
             "https://www.ziatile.com/collections/limestone-tile",
             "https://www.ziatile.com/collections/ceramic-tile"
         ])
+        _run_context["next_data"] = bool(actor_input.get("next_data", False))
 
         # Exit if no start URLs are provided.
         if not start_urls:
@@ -89,62 +108,131 @@ async def main() -> None:
                 subCategory = "Limestone"
             if 'ceramic-tile' in start_url:
                 subCategory = "Ceramic"
-            All_urls = []
-            position = 100
-            while True:
-                params = {
-                    'position': f'{position}',
-                }
-                # Create an HTTPX client to fetch the HTML content of the URLs.
-                async with AsyncClient() as client:
-                    try:
-                        # Fetch the HTTP response from the specified URL using HTTPX.
-                        response = await client.get(start_url, follow_redirects=True, params=params)
-
-                        tree = html.fromstring(response.text)
-
-                        all_links = tree.xpath('//div[@data-position]/div/a/@href')
-                        if len(All_urls) == len(all_links):
-                            break
-
-                        for link in all_links:
-
-                            link_url = urljoin('https://www.ziatile.com', link)
-
-                            if link_url.startswith(('http://', 'https://')):
-                                if link_url not in All_urls:
-                                    All_urls.append(link_url)
-                                    await process_link_url(link_url, subCategory)
-                        position += 100
-                    except Exception:
-                        Actor.log.exception(f'Cannot extract data from {start_url}.')
-
-
-async def process_link_url(product_url: str, subCategory: str):
-    time.sleep(1)
-    content_html = await fetch_html(product_url)
-    if not content_html:
-        Actor.log.info(f"Response Not Found: {product_url}")
+            products = await collection_products(start_url)
+            if products is not None:
+                for product in products:
+                    await enqueue(shopify_product_url(start_url, product), subCategory, product)
+                continue
+            await list_collection_pages(start_url, subCategory)
+
+
+async def list_collection_pages(start_url: str, subCategory: str) -> None:
+    """Enqueue the products of a collection from its HTML pages.
+
+    Every `position=N` page repeats the tiles of the earlier ones, so only the tiles past the last window are
+    parsed, and the listing stops at the first page that adds no new product.
+    """
+    seen = set()
+    last_position = 0
+    position = 100
+    while True:
+        params = {
+            'position': f'{position}',
+        }
+        try:
+            # Fetch the HTTP response from the specified URL using HTTPX.
+            response = await fetch(start_url, follow_redirects=True, params=params)
+            all_links, last_position = await run_cpu(new_tile_links, response.text, last_position)
+        except Exception:
+            Actor.log.exception(f'Cannot extract data from {start_url}.')
+            return
+        new_links = 0
+        for link in all_links:
+
+            link_url = urljoin('https://www.ziatile.com', link)
+
+            if link_url.startswith(('http://', 'https://')):
+                if link_url not in seen:
+                    seen.add(link_url)
+                    new_links += 1
+                    await enqueue(link_url, subCategory)
+        if not new_links:
+            break
+        position += 100
+
+
+def new_tile_links(content_html: str, after: int) -> tuple[list[str], int]:
+    """Return the links of the tiles placed after `data-position` `after`, and the last position on the page."""
+    positions = [(int(match.group(1)), match.start()) for match in _TILE_POSITION.finditer(content_html)]
+    if not positions:
+        return parse_page(content_html).xpath('//div[@data-position]/div/a/@href'), after
+    start = next((offset for tile_position, offset in positions if tile_position > after), None)
+    if start is None:
+        return [], after
+    # lxml recovers the markup cut off before the first new tile.
+    tree = parse_page(content_html[start:])
+    return tree.xpath('//div[@data-position]/div/a/@href'), max(tile_position for tile_position, _ in positions)
+
+
+def page_fields(tree) -> dict:
+    """Read what products.json does not have: the box calculator of the product page.
+
+    That is the price per square foot, tiles per box, box coverage, price per tile and the overage options. The
+    description block is read as well, for products listed from the collection pages.
+    """
+    return {
+        "description": ''.join(tree.xpath(
+            '//div[@class="product__noteWrapper"]/div//div[@class="sc-79669c64-8 dyCBTc"]//p/text()')),
+        "price": float(''.join(tree.xpath(
+            "//p[text()='Price per ft']/parent::div/following-sibling::div/p/span[2]/text()"))),
+        "tilesPerBox": float(''.join(tree.xpath("//p[text()='Tiles/Box']/following-sibling::p/text()"))),
+        "boxCoverageSqFt": float(''.join(
+            tree.xpath("//p[text()='Total ft']/parent::div/following-sibling::p/span/text()"))),
+        "pricePerTile": float(''.join(tree.xpath(
+            "//p[text()='Price per tile']/parent::div/following-sibling::p/span[2]/text()"))),
+        "overageRecommendation": '-'.join(tree.xpath('//select[@name="overage"]/option/text()')[1:]).strip(),
+    }
+
+
+async def process_link_url(product_url: str, subCategory: str, product: dict | None = None):
+    if product is not None and await product_unchanged(product_url, product_fingerprint(product)):
         return
-    soup = BeautifulSoup(content_html, 'html.parser')
-    visible_text = soup.get_text(strip=True)
-    compressed = gzip.compress(visible_text.encode('utf-8'))
-    raw_text = base64.b64encode(compressed).decode('utf-8')
-    tree = html.fromstring(content_html)
-    json_response = tree.xpath('//script[@id="__NEXT_DATA__"]/text()')[0]
-    json_data = json.loads(json_response)
-    name = ''.join(json_data['props']['pageProps']['product']['title'])
-    product_type = ''.join(json_data['props']['pageProps']['product']['productType'])
+    if _run_context["next_data"]:
+        page_props = None
+        if product is None and previous_fingerprint(product_url) is not None:
+            # The data route tells whether a product seen last run changed without downloading the page.
+            page_props = await next_page_props(product_url)
+            if page_props is not None and await product_unchanged(product_url, page_props_fingerprint(page_props)):
+                return
+        page = await stream_next_data(product_url)
+        if page is None or page[1] is None:
+            Actor.log.info(f"Response Not Found: {product_url}")
+            return
+        content_html, json_response = page
+        json_data = json.loads(json_response)
+        if (product is None and page_props is None
+                and await product_unchanged(product_url, page_props_fingerprint(json_data['props']['pageProps']))):
+            return
+        tree = await run_cpu(parse_page, content_html)
+    else:
+        content_html = await fetch_html(product_url)
+        if not content_html:
+            Actor.log.info(f"Response Not Found: {product_url}")
+            return
+        tree = await run_cpu(parse_page, content_html)
+        json_response = tree.xpath('//script[@id="__NEXT_DATA__"]/text()')[0]
+        if product is None and await product_unchanged(product_url, content_fingerprint(json_response)):
+            return
+        json_data = json.loads(json_response)
+    visible_text = await run_cpu(page_text, tree)
+    raw_text = await run_cpu(encode_raw_text, visible_text)
+    page_product = json_data['props']['pageProps']['product']
+    if product is not None:
+        name = product['title']
+        product_type = product['product_type']
+        img_url = product_images(product)
+        tags = list(product['tags'])
+    else:
+        name = ''.join(page_product['title'])
+        product_type = ''.join(page_product['productType'])
+        img_url = [img['src'] for img in page_product['images']]
+        tags = page_product['tags']
+    fields = await run_cpu(page_fields, tree)
 
     product_id = 'zia-' + name.lower().replace(' ', '-') + '-' + product_type.lower()
 
-    description = ''.join(tree.xpath(
-        '//div[@class="product__noteWrapper"]/div//div[@class="sc-79669c64-8 dyCBTc"]//p/text()'))
-    img_url = []
-    images = json_data['props']['pageProps']['product']['images']
-    for img in images:
-        src = img['src']
-        img_url.append(src)
+    description = (product_description(product) if product is not None else None) or fields['description']
+    # The tile usages and the metafields below are only in the page's __NEXT_DATA__, not in products.json.
     use_case = []
     tile_usages = json_data['props']['story']['content']['tileUsages']
     for tile_ in tile_usages:
@@ -154,28 +242,18 @@ async def process_link_url(product_url: str, subCategory: str):
                 if tile['usable']:
                     tile__usages = tile['title']
                     use_case.append(tile__usages)
-    if not img_url:
-        img_url = []
-    tags = json_data['props']['pageProps']['product']['tags']
     tags[:] = [z for z in tags if all(x not in z for x in [':', '|', ' - ', ': '])]
-    price = float(''.join(tree.xpath(
-        "//p[text()='Price per ft']/parent::div/following-sibling::div/p/span[2]/text()")))
-    tiles_per_box = ''.join(tree.xpath("//p[text()='Tiles/Box']/following-sibling::p/text()"))
-    box_Coverage_SqFt = ''.join(
-        tree.xpath("//p[text()='Total ft']/parent::div/following-sibling::p/span/text()"))
-    price_per_tile = float(''.join(tree.xpath(
-        "//p[text()='Price per tile']/parent::div/following-sibling::p/span[2]/text()")))
-    overageRecommendation = '-'.join(tree.xpath('//select[@name="overage"]/option/text()')[1:]).strip()
+    price = fields['price']
 
     additionalData = {
         "priceUnit": "per sqft",
-        "tilesPerBox": float(tiles_per_box),
-        "boxCoverageSqFt": float(box_Coverage_SqFt),
-        "pricePerTile": float(price_per_tile),
-        "overageRecommendation": overageRecommendation,
+        "tilesPerBox": fields['tilesPerBox'],
+        "boxCoverageSqFt": fields['boxCoverageSqFt'],
+        "pricePerTile": fields['pricePerTile'],
+        "overageRecommendation": fields['overageRecommendation'],
         "raw_text": raw_text
     }
-    meta_data = json_data['props']['pageProps']['product']['metafields']
+    meta_data = page_product['metafields']
     lead_time = None
     color = None
     thickness = None
@@ -250,4 +328,4 @@ async def process_link_url(product_url: str, subCategory: str):
             "specifications": specifications,
             "additionalData": additionalData}
 
-    await Actor.push_data(item)
+    await emit(item)
@@ -0,0 +1,104 @@
+"""Next.js page data without building a DOM to find it.
+
+`next_page_props()` reads a page's props from the `/_next/data/<buildId>/<path>.json` route, a small JSON document,
+once a build ID is known. `stream_next_data()` streams the page itself and scans the text as it arrives for the
+`<script id="__NEXT_DATA__">` element; the response is closed as soon as that script ends, and the HTML read up to
+that point (which holds all of the server-rendered markup) is returned with the script's JSON. Every streamed page
+refreshes the build ID, so a deployment during the run only costs one fallback per product.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from urllib.parse import urlsplit
+
+from apify import Actor
+
+from .http_client import fetch, get_client
+from .incremental import content_fingerprint
+from .rate_limit import acquire
+from .retry import RETRYABLE_STATUS_CODES, with_retries
+
+_NEXT_DATA_OPEN = re.compile(r'<script\b[^>]*\bid=["\']?__NEXT_DATA__\b[^>]*>', re.IGNORECASE)
+# Longest opening tag looked for across chunk boundaries.
+_MAX_TAG_LENGTH = 512
+_SCRIPT_CLOSE = '</script>'
+
+_next_data_context = {
+    "build_id": None,
+}
+
+
+async def next_page_props(page_url: str) -> dict | None:
+    """Return the props of a page from the Next.js data route, or None when the route cannot serve it."""
+    build_id = _next_data_context["build_id"]
+    if build_id is None:
+        return None
+    parts = urlsplit(page_url)
+    data_url = f'{parts.scheme}://{parts.netloc}/_next/data/{build_id}{parts.path.rstrip("/")}.json'
+    response = await fetch(data_url, follow_redirects=False, headers={'x-nextjs-data': '1'})
+    if response.status_code != 200:
+        Actor.log.info(f'No Next.js data for {page_url} in build {build_id}, reading the page instead.')
+        return None
+    try:
+        data = json.loads(response.text)
+    except ValueError:
+        return None
+    return data.get('pageProps')
+
+
+async def stream_next_data(page_url: str) -> tuple[str, str | None] | None:
+    """Return the HTML of a page up to the end of its `__NEXT_DATA__` script, and the script's JSON text.
+
+    None when the page is not found; the JSON text is None when the page has no `__NEXT_DATA__`, in which case the
+    whole page is returned.
+    """
+    client = await get_client(page_url)
+    request = client.build_request('GET', page_url)
+
+    async def send():
+        await acquire(page_url)
+        response = await client.send(request, stream=True)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            await response.aclose()
+        return response
+
+    Actor.log.info(f"Fetching: {page_url}")
+    response = await with_retries(page_url, send)
+    try:
+        if response.status_code != 200:
+            return None
+        buffer = ''
+        scan_from = 0
+        script_start = None
+        async for chunk in response.aiter_text():
+            buffer += chunk
+            if script_start is None:
+                match = _NEXT_DATA_OPEN.search(buffer, scan_from)
+                if match is None:
+                    scan_from = max(0, len(buffer) - _MAX_TAG_LENGTH)
+                    continue
+                script_start = scan_from = match.end()
+            script_end = buffer.find(_SCRIPT_CLOSE, scan_from)
+            if script_end == -1:
+                scan_from = max(script_start, len(buffer) - len(_SCRIPT_CLOSE))
+                continue
+            next_data = buffer[script_start:script_end]
+            _remember_build(next_data, page_url)
+            return buffer[:script_end + len(_SCRIPT_CLOSE)], next_data
+        return buffer, None
+    finally:
+        await response.aclose()
+
+
+def page_props_fingerprint(page_props: dict) -> str:
+    """Fingerprint of a page's props, the same whether they came from the data route or the page."""
+    return content_fingerprint(json.dumps(page_props, sort_keys=True))
+
+
+def _remember_build(next_data: str, page_url: str) -> None:
+    match = re.search(r'"buildId"\s*:\s*"([^"]+)"', next_data)
+    if match and match.group(1) != _next_data_context["build_id"]:
+        Actor.log.info(f'Next.js build {match.group(1)} found on {page_url}.')
+        _next_data_context["build_id"] = match.group(1)
@@ -0,0 +1,100 @@
+"""Shared fixtures for the tests of the modules every actor carries in its `src/`.
+
+The modules are identical copies (see `test_shared_modules.py`), so they are imported once, from the Zia Tile
+Scraper actor, as the `src` package. Code that only one actor carries is imported with `actor_module()`.
+"""
+
+from __future__ import annotations
+
+import copy
+import importlib
+import importlib.util
+import logging
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'Zia Tile Scraper'))
+
+
+_packages = {'src'}
+
+
+def actor_module(directory: str, module: str):
+    """Import `module` from the `src/` of the actor in `directory`, as a package of its own next to `src`."""
+    package = re.sub(r'\W+', '_', directory.lower())
+    if package not in sys.modules:
+        source = ROOT / directory / 'src'
+        spec = importlib.util.spec_from_file_location(package, source / '__init__.py',
+                                                      submodule_search_locations=[str(source)])
+        sys.modules[package] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules[package])
+        _packages.add(package)
+    return importlib.import_module(f'{package}.{module}')
+
+
+def actor_modules() -> list:
+    """The modules of the actor packages the tests have imported."""
+    return [module for name, module in list(sys.modules.items()) if name.split('.')[0] in _packages]
+
+
+class FakeKeyValueStore:
+    def __init__(self):
+        self.records = {}
+
+    async def get_value(self, key, default_value=None):
+        return self.records.get(key, default_value)
+
+    async def set_value(self, key, value, content_type=None):
+        if value is None:
+            self.records.pop(key, None)
+        else:
+            self.records[key] = value
+
+
+class FakeActor:
+    """The parts of `apify.Actor` the shared modules use."""
+
+    def __init__(self):
+        self.input = {}
+        self.log = logging.getLogger('actor')
+        self.pushed = []
+        self.push_calls = []
+        self.stores = {}
+        self.listeners = {}
+
+    async def get_input(self):
+        return self.input
+
+    async def push_data(self, data):
+        items = data if isinstance(data, list) else [data]
+        self.push_calls.append(list(items))
+        self.pushed.extend(items)
+
+    async def open_key_value_store(self, name=None):
+        return self.stores.setdefault(name, FakeKeyValueStore())
+
+    def on(self, event, listener):
+        self.listeners.setdefault(event, []).append(listener)
+
+    def off(self, event, listener):
+        self.listeners.get(event, []).remove(listener)
+
+
+@pytest.fixture
+def actor(monkeypatch):
+    fake = FakeActor()
+    contexts = []
+    for module in actor_modules():
+        if hasattr(module, 'Actor'):
+            monkeypatch.setattr(module, 'Actor', fake)
+        for name, value in vars(module).items():
+            if name.endswith('_context') and isinstance(value, dict):
+                contexts.append((value, copy.deepcopy(value)))
+    yield fake
+    for context, saved in contexts:
+        context.clear()
+        context.update(saved)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from src import cache, http_client
+
+
+def serve(actor, handler, *urls, options=None):
+    """Fetch `urls` in order through a cache kept in a fake store, with `handler` answering every request."""
+    requests = []
+
+    def transport(request):
+        # A copy: the request is sent again, with other headers, when a stored body is lost.
+        requests.append(httpx.Request(request.method, request.url, headers=request.headers))
+        return handler(request)
+
+    async def main():
+        await cache.open_cache(options or {}, 'http-cache')
+        http_client._client_context["clients"]["shop.test"] = httpx.AsyncClient(
+            transport=httpx.MockTransport(transport))
+        try:
+            return [await http_client.fetch(url) for url in urls]
+        finally:
+            await http_client.close_clients()
+            await cache.close_cache()
+
+    return asyncio.run(main()), requests
+
+
+def etag_server(request):
+    if request.headers.get('if-none-match') == '"v1"':
+        return httpx.Response(304, headers={'etag': '"v1"'})
+    return httpx.Response(200, headers={'etag': '"v1"', 'content-type': 'text/html'}, text='<p>page</p>')
+
+
+def test_revalidates_with_the_stored_validator(actor):
+    responses, requests = serve(actor, etag_server, 'https://shop.test/p', 'https://shop.test/p')
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[1].text == '<p>page</p>'
+    assert 'if-none-match' not in requests[0].headers
+    assert requests[1].headers['if-none-match'] == '"v1"'
+
+
+def test_fresh_entries_are_served_without_a_request(actor):
+    responses, requests = serve(actor, etag_server, 'https://shop.test/p', 'https://shop.test/p',
+                                options={"http_cache_ttl": 60.0})
+    assert [response.text for response in responses] == ['<p>page</p>', '<p>page</p>']
+    assert len(requests) == 1
+
+
+def test_responses_without_validators_are_not_stored(actor):
+    responses, requests = serve(actor, lambda request: httpx.Response(200, text='x'),
+                                'https://shop.test/p', 'https://shop.test/p')
+    assert len(requests) == 2
+    assert 'if-none-match' not in requests[1].headers
+    assert actor.stores['http-cache'].records[cache.INDEX_KEY] == {}
+
+
+def test_eviction_keeps_the_store_under_its_size_limit(actor):
+    responses, requests = serve(actor, etag_server, 'https://shop.test/a', 'https://shop.test/b',
+                                options={"http_cache_max_bytes": 40})
+    index = actor.stores['http-cache'].records[cache.INDEX_KEY]
+    assert [entry["url"] for entry in index.values()] == ['https://shop.test/b']
+
+
+def lose_stored_bodies(actor, corrupt=False):
+    """Wrap the store so that cached bodies disappear (or come back corrupt) once the index is loaded."""
+    store = asyncio.run(actor.open_key_value_store('http-cache'))
+    get_value = store.get_value
+
+    async def lossy_get_value(key, default_value=None):
+        value = await get_value(key, default_value)
+        if key == cache.INDEX_KEY or value is None:
+            return value
+        return b'not gzip' if corrupt else None
+
+    store.get_value = lossy_get_value
+
+
+def test_revalidated_entry_without_a_body_is_fetched_again(actor):
+    lose_stored_bodies(actor)
+    responses, requests = serve(actor, etag_server, 'https://shop.test/p', 'https://shop.test/p')
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[1].text == '<p>page</p>'
+    assert [request.headers.get('if-none-match') for request in requests] == [None, '"v1"', None]
+
+
+def test_revalidated_entry_with_an_unreadable_body_is_fetched_again(actor):
+    lose_stored_bodies(actor, corrupt=True)
+    responses, requests = serve(actor, etag_server, 'https://shop.test/p', 'https://shop.test/p')
+    assert responses[1].status_code == 200
+    assert responses[1].text == '<p>page</p>'
+    assert len(requests) == 3
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from src import dataset
+
+
+def test_items_are_written_in_batches(actor):
+    actor.input = {"push_batch_size": 3, "push_interval": 60.0}
+
+    async def main():
+        async with dataset.dataset_writer():
+            for n in range(7):
+                await dataset.push_items({"id": n})
+            assert [len(batch) for batch in actor.push_calls] == [3, 3]
+
+    asyncio.run(main())
+    assert [len(batch) for batch in actor.push_calls] == [3, 3, 1]
+    assert [item["id"] for item in actor.pushed] == list(range(7))
+
+
+def test_large_items_fill_a_batch_by_size(actor):
+    actor.input = {"push_batch_size": 100, "push_batch_bytes": 1000, "push_interval": 60.0}
+
+    async def main():
+        async with dataset.dataset_writer():
+            await dataset.push_items([{"text": 'x' * 600}])
+            assert actor.push_calls == []
+            await dataset.push_items([{"text": 'y' * 600}])
+            assert len(actor.push_calls) == 1
+
+    asyncio.run(main())
+
+
+def test_buffer_is_written_periodically(actor):
+    actor.input = {"push_interval": 0.05}
+
+    async def main():
+        async with dataset.dataset_writer():
+            await dataset.push_items({"id": 1})
+            await asyncio.sleep(0.2)
+            assert actor.pushed == [{"id": 1}]
+
+    asyncio.run(main())
+
+
+def test_buffer_is_written_on_migration(actor):
+    actor.input = {"push_interval": 60.0}
+
+    async def main():
+        async with dataset.dataset_writer():
+            await dataset.push_items({"id": 1})
+            for listener in list(actor.listeners[dataset.Event.MIGRATING]):
+                await listener()
+            assert actor.pushed == [{"id": 1}]
+
+    asyncio.run(main())
+
+
+def test_failed_batch_is_kept_for_the_next_flush(actor):
+    actor.input = {"push_interval": 60.0}
+    push_data = actor.push_data
+    failures = [RuntimeError('storage unavailable')]
+
+    async def flaky_push(data):
+        if failures:
+            raise failures.pop()
+        await push_data(data)
+
+    actor.push_data = flaky_push
+
+    async def main():
+        async with dataset.dataset_writer():
+            await dataset.push_items([{"id": 1}, {"id": 2}])
+            with pytest.raises(RuntimeError):
+                await dataset.flush()
+            await dataset.push_items({"id": 3})
+
+    asyncio.run(main())
+    assert [item["id"] for item in actor.pushed] == [1, 2, 3]
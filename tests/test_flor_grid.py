@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+
+import httpx
+
+from conftest import actor_module
+
+flor = actor_module('Flor Scraper', 'main')
+http_client = actor_module('Flor Scraper', 'http_client')
+rate_limit = actor_module('Flor Scraper', 'rate_limit')
+
+CATEGORY_PAGE = (Path(__file__).parent / 'fixtures' / 'grids' / 'sfcc_category.html').read_text(encoding='utf-8')
+CATALOG = 10  # Products in the category; the page claims 8, so the last ones are only found by the in-order walk.
+
+
+def tiles(numbers) -> str:
+    return ''.join(f'<div class="b-product-tile"><div class="b-product-tile__wishlist js-product"></div>'
+                   f'<a href="/p/{name}.html">{name}</a></div>' for name in numbers)
+
+
+def grid_server(failures: dict):
+    """Answer the category page and its Search-UpdateGrid pages; `failures` maps offsets to failures left."""
+    requests = []
+
+    def handler(request):
+        requests.append(request.url)
+        params = request.url.params
+        start, size = int(params['start']), int(params['sz'])
+        if not request.url.path.endswith('Search-UpdateGrid'):
+            return httpx.Response(200, text=CATEGORY_PAGE)
+        if failures.get(start):
+            failures[start] -= 1
+            return httpx.Response(404)
+        if params.get('cgid') != 'area-rugs':
+            return httpx.Response(200, text=tiles(f'other-{n}-01' for n in range(size)))
+        return httpx.Response(200, text=tiles(f'rug-{n}-01' for n in range(start, min(start + size, CATALOG))))
+
+    return handler, requests
+
+
+def list_grid(actor, failures=None):
+    handler, requests = grid_server(failures or {})
+
+    async def main():
+        await rate_limit.configure_rate_limits(default={"rate": 0})
+        http_client._client_context["clients"]["www.flor.com"] = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler))
+        try:
+            return await flor.list_grid('https://www.flor.com/area-rugs/?srule=new', 3, 2)
+        finally:
+            await http_client.close_clients()
+
+    return asyncio.run(main()), requests
+
+
+def test_grid_pages_keep_their_category(actor):
+    links, requests = list_grid(actor)
+    assert links == [f'https://www.flor.com/p/rug-{n}-01.html' for n in range(CATALOG)]
+    assert requests[0].params['srule'] == 'new'
+    assert all(url.params['cgid'] == 'area-rugs' for url in requests[1:])
+
+
+def test_a_failed_offset_is_fetched_again(actor):
+    links, requests = list_grid(actor, failures={6: 1})
+    assert links == [f'https://www.flor.com/p/rug-{n}-01.html' for n in range(CATALOG)]
+    assert [url.params['start'] for url in requests].count('6') == 2
+
+
+def test_an_offset_that_keeps_failing_is_reported(actor, caplog):
+    with caplog.at_level(logging.WARNING):
+        links, _ = list_grid(actor, failures={3: 2})
+    assert 'https://www.flor.com/p/rug-3-01.html' not in links
+    assert 'https://www.flor.com/p/rug-6-01.html' in links
+    assert 'offset 3 failed twice' in caplog.text
+
+
+def test_grid_total_reads_only_the_result_count():
+    assert flor.grid_total(flor.parse_page(CATEGORY_PAGE)) == 8
+    without_count = CATEGORY_PAGE.replace('<span class="search-result-count">8 Results</span>', '')
+    assert flor.grid_total(flor.parse_page(without_count)) is None
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from conftest import actor_module
+
+dataset = actor_module('Flor Scraper', 'dataset')
+variants = actor_module('Flor Scraper', 'variants')
+
+RUG = ('https://www.flor.com/p/rug', '20x20', 'blue')
+
+
+def records(actor) -> dict:
+    return {key: value for key, value in actor.stores[None].records.items() if key != variants.INDEX_KEY}
+
+
+def run(actor, *steps):
+    """Run `steps` (coroutine functions) inside a dataset writer and a variant store, in order."""
+    actor.input = {"push_interval": 60.0}
+
+    async def main():
+        async with dataset.dataset_writer(), variants.variant_store():
+            for step in steps:
+                await step()
+
+    asyncio.run(main())
+
+
+async def write_all():
+    async for item in variants.best_variants():
+        await dataset.push_items(item)
+
+
+def test_the_highest_variant_number_wins(actor):
+    async def keep():
+        await variants.keep_variant(RUG, 2, {"id": "rug-2"})
+        await variants.keep_variant(RUG, 1, {"id": "rug-1"})
+        await variants.keep_variant(RUG, 3, {"id": "rug-3"})
+        assert [item["id"] for item in records(actor).values()] == ['rug-3']
+
+    run(actor, keep, write_all)
+    assert [item["id"] for item in actor.pushed] == ['rug-3']
+    assert records(actor) == {}
+
+
+def test_claimed_ids_hold_against_lower_variants(actor):
+    async def keep():
+        variants.claim_ids(['rug'], 4)
+        await variants.keep_variant(RUG, 3, {"id": "rug"})
+        await variants.keep_variant(RUG, 5, {"id": "rug", "n": 5})
+
+    run(actor, keep, write_all)
+    assert actor.pushed == [{"id": "rug", "n": 5}]
+
+
+def test_a_failed_write_keeps_the_previous_variant(actor):
+    store = asyncio.run(actor.open_key_value_store())
+    set_value = store.set_value
+
+    async def failing_set_value(key, value, content_type=None):
+        if key.endswith('-2') and value is not None:
+            raise RuntimeError('storage unavailable')
+        await set_value(key, value, content_type)
+
+    async def keep():
+        store.set_value = failing_set_value
+        await variants.keep_variant(RUG, 1, {"id": "rug-1"})
+        with pytest.raises(RuntimeError):
+            await variants.keep_variant(RUG, 2, {"id": "rug-2"})
+
+    run(actor, keep, write_all)
+    assert [item["id"] for item in actor.pushed] == ['rug-1']
+
+
+def test_concurrent_variants_leave_one_record(actor):
+    async def keep():
+        await asyncio.gather(*(variants.keep_variant(RUG, n, {"id": f'rug-{n}'}) for n in (2, 5, 3, 1)))
+
+    run(actor, keep)
+    assert [item["id"] for item in records(actor).values()] == ['rug-5']
+
+
+def test_records_outlive_a_failed_dataset_write(actor):
+    push_data = actor.push_data
+
+    async def failing_push(data):
+        raise RuntimeError('storage unavailable')
+
+    async def keep():
+        await variants.keep_variant(RUG, 1, {"id": "rug-1"})
+        actor.push_data = failing_push
+
+    with pytest.raises(RuntimeError):
+        run(actor, keep, write_all)
+    assert [item["id"] for item in records(actor).values()] == ['rug-1']
+    actor.push_data = push_data
+
+
+def test_a_restarted_run_resumes_the_saved_index(actor):
+    async def keep_and_migrate():
+        await variants.keep_variant(RUG, 2, {"id": "rug-2"})
+        variants.claim_ids(['other'], 7)
+        for listener in list(actor.listeners[variants.Event.MIGRATING]):
+            await listener()
+
+    async def keep_again():
+        await variants.keep_variant(RUG, 1, {"id": "rug-1"})
+        await variants.keep_variant(('https://www.flor.com/p/other', '20x20', 'red'), 6, {"id": "other"})
+
+    run(actor, keep_and_migrate)
+    run(actor, keep_again, write_all)
+    assert [item["id"] for item in actor.pushed] == ['rug-2']
+    assert actor.stores[None].records == {}
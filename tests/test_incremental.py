@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+
+from src import incremental, pipeline
+
+
+def crawl(actor, pages, previous=None, enabled=True):
+    """Run `pages` ({url: fingerprint or an exception}) through the pipeline and return the saved state."""
+    actor.input = {"incremental": enabled}
+    store = asyncio.run(actor.open_key_value_store('incremental'))
+    if previous is not None:
+        store.records[incremental.STATE_KEY] = previous
+
+    async def handler(url):
+        page = pages[url]
+        if await incremental.product_unchanged(url, incremental.content_fingerprint(page["text"])):
+            return
+        if page.get("error"):
+            raise page["error"]
+        await pipeline.emit([{"id": item_id} for item_id in page["ids"]])
+
+    async def main():
+        async with incremental.incremental_run('incremental'), pipeline.product_pipeline(handler):
+            for url in pages:
+                await pipeline.enqueue(url)
+
+    actor.pushed.clear()
+    asyncio.run(main())
+    return store.records[incremental.STATE_KEY]
+
+
+def test_fingerprint_is_stable_and_separates_parts():
+    assert incremental.content_fingerprint('a', 'b') == incremental.content_fingerprint('a', 'b')
+    assert incremental.content_fingerprint('ab', '') != incremental.content_fingerprint('a', 'b')
+    assert incremental.content_fingerprint(None) == incremental.content_fingerprint('')
+
+
+def test_unchanged_products_are_skipped_and_keep_their_ids(actor):
+    first = crawl(actor, {'https://shop.test/a': {"text": 'A', "ids": ['a1', 'a2']},
+                          'https://shop.test/b': {"text": 'B', "ids": ['b1']}})
+    assert {item["id"] for item in actor.pushed} == {'a1', 'a2', 'b1'}
+
+    second = crawl(actor, {'https://shop.test/a': {"text": 'A', "ids": ['a1', 'a2']},
+                           'https://shop.test/b': {"text": 'B2', "ids": ['b1']}}, previous=first)
+    assert [item["id"] for item in actor.pushed] == ['b1']
+    assert second['https://shop.test/a']["ids"] == ['a1', 'a2']
+
+
+def test_items_no_longer_produced_are_reported_removed(actor):
+    first = crawl(actor, {'https://shop.test/a': {"text": 'A', "ids": ['a1', 'a2']}})
+    crawl(actor, {'https://shop.test/a': {"text": 'A2', "ids": ['a1']}}, previous=first)
+    removed = [item for item in actor.pushed if item.get("removed")]
+    assert [item["id"] for item in removed] == ['a2']
+
+
+def test_a_failed_product_keeps_its_ids_and_is_parsed_again(actor):
+    first = crawl(actor, {'https://shop.test/a': {"text": 'A', "ids": ['a1']}})
+    second = crawl(actor, {'https://shop.test/a': {"text": 'A2', "error": ValueError('broken')}}, previous=first)
+    assert second['https://shop.test/a'] == {"fingerprint": None, "ids": ['a1']}
+    assert not [item for item in actor.pushed if item.get("removed")]
+
+
+def test_nothing_is_skipped_when_disabled(actor):
+    first = crawl(actor, {'https://shop.test/a': {"text": 'A', "ids": ['a1']}})
+    crawl(actor, {'https://shop.test/a': {"text": 'A', "ids": ['a1']}}, previous=first, enabled=False)
+    assert [item["id"] for item in actor.pushed] == ['a1']
+
+
+def test_product_ids_of_a_skipped_product_come_from_the_last_run(actor):
+    first = crawl(actor, {'https://shop.test/a': {"text": 'A', "ids": ['a1', 'a2']}})
+    seen = {}
+
+    async def main():
+        async with incremental.incremental_run('incremental'):
+            await incremental.product_unchanged('https://shop.test/a', incremental.content_fingerprint('A'))
+            seen['a'] = incremental.product_ids('https://shop.test/a')
+            seen['new'] = incremental.product_ids('https://shop.test/new')
+
+    actor.stores['incremental'].records[incremental.STATE_KEY] = first
+    asyncio.run(main())
+    assert seen == {'a': ['a1', 'a2'], 'new': []}
+
+
+def test_previous_fingerprint_only_when_enabled(actor):
+    first = crawl(actor, {'https://shop.test/a': {"text": 'A', "ids": ['a1']}})
+    seen = {}
+
+    async def main():
+        async with incremental.incremental_run('incremental'):
+            seen['a'] = incremental.previous_fingerprint('https://shop.test/a')
+            seen['new'] = incremental.previous_fingerprint('https://shop.test/new')
+
+    store = actor.stores['incremental']
+    for enabled in (True, False):
+        actor.input = {"incremental": enabled}
+        store.records[incremental.STATE_KEY] = first
+        asyncio.run(main())
+        assert seen == ({'a': incremental.content_fingerprint('A'), 'new': None} if enabled
+                        else {'a': None, 'new': None})
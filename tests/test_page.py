@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import base64
+import gzip
+from pathlib import Path
+
+import pytest
+
+from src import page
+
+bs4 = pytest.importorskip('bs4')
+
+FIXTURES = sorted((Path(__file__).parent / 'fixtures' / 'pages').glob('*.html'))
+
+
+def soup_text(content_html: str) -> str:
+    return bs4.BeautifulSoup(content_html, 'html.parser').get_text(strip=True)
+
+
+@pytest.mark.parametrize('fixture', FIXTURES, ids=[fixture.stem for fixture in FIXTURES])
+def test_page_text_matches_beautifulsoup(fixture):
+    content_html = fixture.read_text(encoding='utf-8')
+    assert page.page_text(page.parse_page(content_html)) == soup_text(content_html)
+
+
+@pytest.mark.parametrize('content_html', [
+    '<html><body><p>unclosed<b>x</p> yz<i>q</body></html>',
+    '<p><b>a<i>b</b>c</i>d</p>',
+    '<div>a</div><plaintext><b>x</b> y',
+    '<form><textarea> <b>x</b> </textarea>z</form>',
+    '<p>t</p></html> after',
+    '<table>t1<tr><td>c</td></tr></table>',
+])
+def test_page_text_matches_beautifulsoup_on_broken_markup(content_html):
+    assert page.page_text(page.parse_page(content_html)) == soup_text(content_html)
+
+
+@pytest.mark.parametrize('content_html, expected, soup_expected', [
+    # A stray end tag splits html.parser's string; libxml2 keeps one text node.
+    ('<html><body>x </div> y</body></html>', 'x  y', 'xy'),
+    ('<div>a<![CDATA[ b ]]>c</div>', 'ac', 'abc'),
+    ('<textarea>a &lt;b&gt; c</textarea>', 'ac', 'a <b> c'),
+])
+def test_documented_differences(content_html, expected, soup_expected):
+    assert page.page_text(page.parse_page(content_html)) == expected
+    assert soup_text(content_html) == soup_expected
+
+
+def test_fragment_text():
+    assert page.fragment_text(' <b>Width:</b> 54" <script>x()</script>') == 'Width:54"'
+
+
+def test_raw_text_encoding_is_deterministic():
+    encoded = page.encode_raw_text('Rug – Ivory')
+    assert encoded == page.encode_raw_text('Rug – Ivory')
+    assert gzip.decompress(base64.b64decode(encoded)).decode('utf-8') == 'Rug – Ivory'
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+
+from src import pipeline
+
+
+def run_products(actor, handler, urls):
+    async def main():
+        async with pipeline.product_pipeline(handler):
+            for url in urls:
+                await pipeline.enqueue(url)
+
+    asyncio.run(main())
+
+
+def test_ordered_output_keeps_submission_order(actor):
+    actor.input = {"max_concurrency": 4, "ordered_output": True}
+    urls = [f'https://shop.test/p/{n}' for n in range(8)]
+
+    async def handler(url):
+        # Later products finish first.
+        await asyncio.sleep(0.01 * (8 - int(url.rsplit('/', 1)[-1])))
+        await pipeline.emit([{"id": url, "variant": 1}, {"id": url, "variant": 2}])
+
+    run_products(actor, handler, urls)
+    assert [(item["id"], item["variant"]) for item in actor.pushed] == [(url, v) for url in urls for v in (1, 2)]
+
+
+def test_failing_product_does_not_stop_the_others(actor):
+    actor.input = {"max_concurrency": 2, "ordered_output": True}
+    urls = [f'https://shop.test/p/{n}' for n in range(5)]
+
+    async def handler(url):
+        if url.endswith('/2'):
+            raise ValueError('broken page')
+        await pipeline.emit({"id": url})
+
+    run_products(actor, handler, urls)
+    assert [item["id"] for item in actor.pushed] == [url for url in urls if not url.endswith('/2')]
+
+
+def test_concurrency_is_bounded(actor):
+    actor.input = {"max_concurrency": 3}
+    running = {"now": 0, "peak": 0}
+
+    async def handler(url):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+
+    run_products(actor, handler, [f'https://shop.test/p/{n}' for n in range(12)])
+    assert running["peak"] == 3
+
+
+def test_per_host_limit(actor):
+    actor.input = {"max_concurrency": 6, "max_concurrency_per_host": 1}
+    running = {}
+    peaks = {}
+
+    async def handler(url):
+        host = url.split('/')[2]
+        running[host] = running.get(host, 0) + 1
+        peaks[host] = max(peaks.get(host, 0), running[host])
+        await asyncio.sleep(0.01)
+        running[host] -= 1
+
+    run_products(actor, handler, [f'https://{host}/p/{n}' for n in range(4) for host in ('a.test', 'b.test')])
+    assert peaks == {'a.test': 1, 'b.test': 1}
+
+
+def test_task_url_is_the_first_http_argument():
+    assert pipeline._task_url(('/relative', 'https://shop.test/p/1', 'https://shop.test/c')) == 'https://shop.test/p/1'
+    assert pipeline._task_url(('no url', None)) is None
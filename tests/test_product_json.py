@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from conftest import actor_module
+
+http_client = actor_module('Eskayel Scraper', 'http_client')
+product_json = actor_module('Eskayel Scraper', 'product_json')
+rate_limit = actor_module('Eskayel Scraper', 'rate_limit')
+
+
+def lookups(actor, handler, *rounds):
+    """Run each round of handles concurrently, one round after the other, and return the products and requests."""
+    requests = []
+
+    def transport(request):
+        requests.append(request.url.path)
+        return handler(request)
+
+    async def main():
+        await rate_limit.configure_rate_limits(default={"rate": 0})
+        http_client._client_context["clients"]["shop.test"] = httpx.AsyncClient(
+            transport=httpx.MockTransport(transport))
+        try:
+            return [await asyncio.gather(*(product_json.product_json('https://shop.test', handle)
+                                           for handle in handles)) for handles in rounds]
+        finally:
+            await http_client.close_clients()
+
+    return asyncio.run(main()), requests
+
+
+def shop(request):
+    if request.url.path == '/products/wallpaper.json':
+        return httpx.Response(200, json={"product": {"handle": "wallpaper"}})
+    if request.url.path == '/products/busy.json':
+        return httpx.Response(403)
+    return httpx.Response(404)
+
+
+def test_callers_share_one_lookup(actor):
+    products, requests = lookups(actor, shop, ['wallpaper'] * 3, ['wallpaper'])
+    assert products == [[{"handle": "wallpaper"}] * 3, [{"handle": "wallpaper"}]]
+    assert requests == ['/products/wallpaper.json']
+
+
+def test_a_missing_product_is_remembered(actor):
+    products, requests = lookups(actor, shop, ['gone'], ['gone'])
+    assert products == [[None], [None]]
+    assert requests == ['/products/gone.json']
+
+
+def test_other_failures_are_tried_again(actor):
+    products, requests = lookups(actor, shop, ['busy'], ['busy'])
+    assert products == [[None], [None]]
+    assert requests == ['/products/busy.json', '/products/busy.json']
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from src import rate_limit
+
+
+def timed_acquires(*urls) -> float:
+    async def main():
+        started = time.monotonic()
+        for url in urls:
+            await rate_limit.acquire(url)
+        return time.monotonic() - started
+
+    return asyncio.run(main())
+
+
+def test_requests_beyond_the_burst_wait_for_tokens(actor):
+    asyncio.run(rate_limit.configure_rate_limits({"shop.test": {"rate": 10, "burst": 2, "jitter": 0}}))
+    # Two requests use the burst, the next three wait 0.1s each.
+    assert 0.28 <= timed_acquires(*['https://shop.test/p'] * 5) < 0.6
+
+
+def test_hosts_have_separate_buckets(actor):
+    asyncio.run(rate_limit.configure_rate_limits({"slow.test": {"rate": 1, "burst": 1, "jitter": 0}},
+                                                 default={"rate": 100, "burst": 10, "jitter": 0}))
+    assert timed_acquires('https://slow.test/a', *['https://fast.test/p'] * 10) < 0.1
+
+
+def test_a_host_matches_its_subdomains_only(actor):
+    asyncio.run(rate_limit.configure_rate_limits({"shop.test": {"rate": 1}}))
+    assert rate_limit._host_settings('shop.test') == {"rate": 1}
+    assert rate_limit._host_settings('api.shop.test') == {"rate": 1}
+    assert rate_limit._host_settings('othershop.test') == {}
+
+
+def test_zero_rate_disables_limiting(actor):
+    asyncio.run(rate_limit.configure_rate_limits({"shop.test": {"rate": 0, "burst": 1}}))
+    assert timed_acquires(*['https://shop.test/p'] * 50) < 0.05
+
+
+def test_the_most_specific_pattern_wins(actor):
+    asyncio.run(rate_limit.configure_rate_limits({"shop.test": {"rate": 1}, "api.shop.test": {"rate": 0}}))
+    assert rate_limit._host_settings('api.shop.test') == {"rate": 0}
+    assert rate_limit._host_settings('www.shop.test') == {"rate": 1}
+    assert timed_acquires(*['https://api.shop.test/entries'] * 20) < 0.05
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from src import retry
+
+
+def responses(*items):
+    """A `send()` that returns (or raises) `items` one after the other and counts its calls."""
+    calls = []
+
+    async def send():
+        item = items[len(calls)]
+        calls.append(item)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    return send, calls
+
+
+@pytest.fixture
+def fast_retries(actor):
+    retry._retry_context.update({"max_retries": 3, "retry_base_delay": 0.001, "retry_max_delay": 0.01,
+                                 "max_retry_time": 5.0})
+
+
+def test_retries_until_success(fast_retries):
+    send, calls = responses(httpx.Response(503), httpx.ConnectError('reset'), httpx.Response(200))
+    response = asyncio.run(retry.with_retries('https://shop.test/p', send))
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_other_statuses_are_returned_at_once(fast_retries):
+    send, calls = responses(httpx.Response(404))
+    assert asyncio.run(retry.with_retries('https://shop.test/p', send)).status_code == 404
+    assert len(calls) == 1
+
+
+def test_last_response_is_returned_when_attempts_run_out(fast_retries):
+    send, calls = responses(*[httpx.Response(502) for _ in range(4)])
+    assert asyncio.run(retry.with_retries('https://shop.test/p', send)).status_code == 502
+    assert len(calls) == 4
+
+
+def test_last_error_is_raised_when_attempts_run_out(fast_retries):
+    send, calls = responses(*[httpx.ReadTimeout('slow') for _ in range(4)])
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(retry.with_retries('https://shop.test/p', send))
+    assert len(calls) == 4
+
+
+def test_retry_after_is_honoured(fast_retries):
+    send, calls = responses(httpx.Response(429, headers={'retry-after': '0.2'}), httpx.Response(200))
+    loop = asyncio.new_event_loop()
+    try:
+        started = loop.time()
+        assert loop.run_until_complete(retry.with_retries('https://shop.test/p', send)).status_code == 200
+        assert loop.time() - started >= 0.2
+    finally:
+        loop.close()
+
+
+def test_retry_after_beyond_the_time_budget_gives_up(fast_retries):
+    retry._retry_context["max_retry_time"] = 1.0
+    send, calls = responses(httpx.Response(503, headers={'retry-after': '60'}), httpx.Response(200))
+    assert asyncio.run(retry.with_retries('https://shop.test/p', send)).status_code == 503
+    assert len(calls) == 1
+
+
+def test_retry_after_formats():
+    assert retry._retry_after(httpx.Response(429, headers={'retry-after': '7'})) == 7.0
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = retry._retry_after(httpx.Response(429, headers={'retry-after': format_datetime(later, usegmt=True)}))
+    assert 28 <= delay <= 30
+    assert retry._retry_after(httpx.Response(429, headers={'retry-after': 'soon'})) is None
+    assert retry._retry_after(httpx.Response(429)) is None
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+
+from conftest import actor_module
+
+schumacher = actor_module('Schumacher Scraper', 'main')
+
+
+def rug(*item_numbers, size='8x10', relationship='SIZE_VARIATION') -> dict:
+    return {"relatedProducts": [
+        {"itemNumber": number, "relationshipType": relationship,
+         "attributes": [{"name": "Size", "value": [{"value": size}]}]} for number in item_numbers]}
+
+
+def test_a_claim_covers_the_size_variations(actor):
+    async def main():
+        assert await schumacher.claim_rug_family('https://schumacher.com/catalog/products/R1', rug('R2', 'R3'))
+        assert not await schumacher.claim_rug_family('https://schumacher.com/catalog/products/R2', rug('R1'))
+        return set(schumacher._rug_family_context["claims"])
+
+    assert asyncio.run(main()) == {'R1', 'R2', 'R3'}
+
+
+def test_only_non_standard_rugs_claim_other_relations(actor):
+    async def main():
+        await schumacher.claim_rug_family('https://schumacher.com/catalog/products/R1', rug('C1', relationship='COLOR'))
+        await schumacher.claim_rug_family('https://schumacher.com/catalog/products/N1',
+                                          rug('C2', size='Non-Standard', relationship='COLOR'))
+        return set(schumacher._rug_family_context["claims"])
+
+    assert asyncio.run(main()) == {'R1', 'N1', 'C2'}
+
+
+def test_settling_tells_the_waiting_siblings(actor):
+    async def main():
+        await schumacher.claim_rug_family('https://schumacher.com/catalog/products/R1', rug('R2'))
+        waiting = asyncio.ensure_future(schumacher.rug_family_emitted('R2'))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        schumacher.settle_rug_family('https://schumacher.com/catalog/products/R1', True)
+        return await waiting, await schumacher.rug_family_emitted('R2')
+
+    assert asyncio.run(main()) == (True, True)
+
+
+def test_a_failed_claimant_releases_its_rugs(actor):
+    async def main():
+        await schumacher.claim_rug_family('https://schumacher.com/catalog/products/R1', rug('R2'))
+        waiting = asyncio.ensure_future(schumacher.rug_family_emitted('R2'))
+        schumacher.settle_rug_family('https://schumacher.com/catalog/products/R1', False)
+        return await waiting, dict(schumacher._rug_family_context["claims"])
+
+    assert asyncio.run(main()) == (False, {})
+
+
+def test_a_sibling_emits_the_family_when_the_claimant_fails(actor, monkeypatch):
+    handled = []
+    failures = {'R1'}
+
+    async def product_json(product_url):
+        await asyncio.sleep(0.01)
+        return '{}', {"props": {"pageProps": {"ssrProduct": rug('R1', 'R2')}}}
+
+    async def product_unchanged(product_url, fingerprint):
+        item_number = product_url.rsplit('/', 1)[-1]
+        handled.append(item_number)
+        await asyncio.sleep(0.01)
+        if item_number in failures:
+            failures.discard(item_number)
+            raise RuntimeError('broken page')
+        return True
+
+    monkeypatch.setattr(schumacher, 'product_json', product_json)
+    monkeypatch.setattr(schumacher, 'product_unchanged', product_unchanged)
+
+    async def main():
+        urls = ['https://schumacher.com/catalog/products/R1', 'https://schumacher.com/catalog/products/R2']
+        results = await asyncio.gather(*(schumacher.handle_link_url(url, 'Rugs') for url in urls),
+                                       return_exceptions=True)
+        await schumacher.handle_link_url(urls[0], 'Rugs')
+        return [type(result).__name__ for result in results]
+
+    assert asyncio.run(main()) == ['RuntimeError', 'NoneType']
+    assert handled == ['R1', 'R2']
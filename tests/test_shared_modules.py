@@ -0,0 +1,27 @@
+"""Every actor is built from its own directory, so the shared modules are copied into each one; keep the copies equal."""
+
+from __future__ import annotations
+
+import pytest
+
+from conftest import ROOT
+
+SHARED_MODULES = ('cache.py', 'dataset.py', 'executor.py', 'http_client.py', 'incremental.py', 'page.py',
+                  'pipeline.py', 'product_json.py', 'rate_limit.py', 'retry.py', 'shopify.py')
+# Only the actors that use them carry these.
+OPTIONAL_MODULES = ('product_json.py', 'shopify.py')
+ACTOR_SOURCES = sorted(path.parent for path in ROOT.glob('*/src/main.py') if path.parent.parent.name != '_template')
+
+
+@pytest.mark.parametrize('module', SHARED_MODULES)
+def test_copies_are_identical(module):
+    copies = {source.parent.name: (source / module).read_bytes() for source in ACTOR_SOURCES
+              if (source / module).exists()}
+    assert copies, f'no actor has {module}'
+    reference = copies.get('Zia Tile Scraper', next(iter(copies.values())))
+    assert [name for name, content in copies.items() if content != reference] == []
+
+
+@pytest.mark.parametrize('module', [module for module in SHARED_MODULES if module not in OPTIONAL_MODULES])
+def test_every_actor_has_the_module(module):
+    assert [source.parent.name for source in ACTOR_SOURCES if not (source / module).exists()] == []
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from src import http_client, rate_limit, shopify
+
+
+def catalog(count: int, tags=lambda number: []):
+    return [{"id": number, "handle": f'product-{number}', "tags": tags(number)} for number in range(count)]
+
+
+def list_collection(actor, handler, collection_url: str):
+    """`collection_products(collection_url)` with every request to shop.test answered by `handler`."""
+    async def main():
+        await rate_limit.configure_rate_limits(default={"rate": 0})
+        http_client._client_context["clients"]["shop.test"] = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler))
+        try:
+            return await shopify.collection_products(collection_url)
+        finally:
+            await http_client.close_clients()
+
+    return asyncio.run(main())
+
+
+def paged(products: list, requests: list):
+    def handler(request):
+        requests.append(request.url)
+        limit = int(request.url.params['limit'])
+        page = int(request.url.params['page'])
+        return httpx.Response(200, json={"products": products[(page - 1) * limit:page * limit]})
+
+    return handler
+
+
+@pytest.mark.parametrize('count, pages', [(0, 1), (1, 1), (249, 1), (250, 2), (251, 2), (600, 3)])
+def test_a_collection_is_read_250_products_at_a_time(actor, count, pages):
+    products = catalog(count)
+    requests = []
+    listed = list_collection(actor, paged(products, requests), 'https://shop.test/collections/rugs')
+    assert listed == products
+    assert [url.path for url in requests] == ['/collections/rugs/products.json'] * pages
+    assert [url.params['page'] for url in requests] == [str(page) for page in range(1, pages + 1)]
+    assert {url.params['limit'] for url in requests} == {'250'}
+
+
+def test_a_tag_in_the_path_keeps_only_the_products_with_every_tag(actor):
+    tags = {0: ['Peel & Stick', 'Blue'], 1: 'Peel & Stick, Green', 2: ['Blue'], 3: ['peel-stick', 'Blue']}
+    products = catalog(4, lambda number: tags[number])
+    requests = []
+    listed = list_collection(actor, paged(products, requests),
+                             'https://shop.test/collections/wallpaper/peel-stick+blue')
+    assert [product['id'] for product in listed] == [0, 3]
+    # The tags filter locally; the whole collection is listed once.
+    assert [url.path for url in requests] == ['/collections/wallpaper/products.json']
+
+
+@pytest.mark.parametrize('response', [
+    httpx.Response(404, text='Not Found'),
+    httpx.Response(200, text='<html>password page</html>'),
+    httpx.Response(200, json={"errors": "Not Found"}),
+])
+def test_a_collection_without_products_json_falls_back_to_its_pages(actor, response):
+    assert list_collection(actor, lambda request: response, 'https://shop.test/collections/rugs') is None
+
+
+def test_a_later_page_failing_falls_back_for_the_whole_collection(actor):
+    products = catalog(300)
+
+    def handler(request):
+        if request.url.params['page'] == '2':
+            return httpx.Response(404)
+        return httpx.Response(200, json={"products": products[:250]})
+
+    assert list_collection(actor, handler, 'https://shop.test/collections/rugs') is None
+
+
+def test_a_url_outside_a_collection_is_not_listed(actor):
+    def handler(request):
+        raise AssertionError(f'unexpected request to {request.url}')
+
+    assert list_collection(actor, handler, 'https://shop.test/pages/rugs') is None
+
+
+@pytest.mark.parametrize('in_collection, url', [
+    (False, 'https://shop.test/products/cloud-nine'),
+    (True, 'https://shop.test/collections/rugs/products/cloud-nine'),
+])
+def test_product_urls(in_collection, url):
+    product = {"handle": "cloud-nine"}
+    assert shopify.shopify_product_url('https://shop.test/collections/rugs/wool', product, in_collection) == url
+
+
+@pytest.mark.parametrize('text, handle', [
+    ('Peel & Stick', 'peel-stick'),
+    ('  Blue  ', 'blue'),
+    ('100% Wool', '100-wool'),
+    ('Grass/Cloth -- Natural', 'grass-cloth-natural'),
+    ('already-a-handle', 'already-a-handle'),
+])
+def test_tags_are_compared_as_handles(text, handle):
+    assert shopify._handleize(text) == handle
+
+
+def test_images_and_description_come_from_the_catalog_entry():
+    product = {"images": [{"src": "https://cdn.test/a.jpg"}, {"src": "https://cdn.test/b.jpg"}],
+               "body_html": '<p>First&nbsp;line.</p>\n<p>Second <strong>line</strong>.</p>'}
+    assert shopify.product_images(product) == ['https://cdn.test/a.jpg', 'https://cdn.test/b.jpg']
+    assert shopify.product_description(product) == 'First\xa0line.\nSecond line.'
+    assert shopify.product_images({"images": []}) == []
+    assert shopify.product_description({"body_html": None}) is None
+    assert shopify.product_description({"body_html": ' <p> </p> '}) is None
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src import http_client, incremental, next_data, rate_limit
+from src import main as zia
+
+NEXT_DATA = json.dumps({"buildId": "build-7", "props": {"pageProps": {"product": {"title": "Tile </b>"}}}})
+HEAD = '<html><head><title>Tile</title></head><body><div id="__next"><h1>Tile</h1></div>'
+PAGE = f'{HEAD}<script id="__NEXT_DATA__" type="application/json">{NEXT_DATA}</script><footer>{"x" * 200}</footer>'
+
+
+def serve(actor, handler, coroutine):
+    """Run `coroutine()` with every request to shop.test answered by `handler`."""
+    async def main():
+        await rate_limit.configure_rate_limits(default={"rate": 0})
+        http_client._client_context["clients"]["shop.test"] = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler))
+        try:
+            return await coroutine()
+        finally:
+            await http_client.close_clients()
+
+    return asyncio.run(main())
+
+
+def chunked(page: str, size: int, sent: list):
+    """A streamed body of `page` in `size`-byte chunks, recording how many were read."""
+    body = page.encode('utf-8')
+
+    async def stream():
+        for offset in range(0, len(body), size):
+            sent.append(offset)
+            yield body[offset:offset + size]
+
+    return stream()
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 16, 31, 64, 4096])
+def test_the_script_is_found_across_chunk_boundaries(actor, size):
+    sent = []
+    html, text = serve(actor, lambda request: httpx.Response(200, content=chunked(PAGE, size, sent)),
+                       lambda: next_data.stream_next_data('https://shop.test/products/tile'))
+    assert text == NEXT_DATA
+    assert html == PAGE[:PAGE.index('</script>') + len('</script>')]
+    assert next_data._next_data_context["build_id"] == 'build-7'
+    # The footer after the script is not downloaded.
+    assert sent[-1] < len(PAGE) - 200 or size == 4096
+
+
+def test_a_page_without_next_data_is_returned_whole(actor):
+    page = HEAD + '</body></html>'
+    result = serve(actor, lambda request: httpx.Response(200, content=chunked(page, 5, [])),
+                   lambda: next_data.stream_next_data('https://shop.test/products/tile'))
+    assert result == (page, None)
+
+
+def test_a_missing_page_is_none(actor):
+    assert serve(actor, lambda request: httpx.Response(404),
+                 lambda: next_data.stream_next_data('https://shop.test/products/gone')) is None
+
+
+def test_the_data_route_uses_the_known_build(actor):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path == '/_next/data/build-7/products/tile.json':
+            return httpx.Response(200, json={"pageProps": {"product": {"title": "Tile"}}})
+        return httpx.Response(404)
+
+    next_data._next_data_context["build_id"] = 'build-7'
+    props = serve(actor, handler, lambda: next_data.next_page_props('https://shop.test/products/tile'))
+    assert props == {"product": {"title": "Tile"}}
+    assert requests[0].headers['x-nextjs-data'] == '1'
+    assert serve(actor, handler, lambda: next_data.next_page_props('https://shop.test/products/gone')) is None
+
+
+@pytest.mark.parametrize('enabled, previous, asked', [(False, True, False), (True, False, False), (True, True, True)])
+def test_the_data_route_is_asked_only_for_products_seen_last_run(actor, monkeypatch, enabled, previous, asked):
+    calls = []
+
+    async def next_page_props(product_url):
+        calls.append(product_url)
+        return None
+
+    async def stream_next_data(product_url):
+        return None
+
+    monkeypatch.setattr(zia, 'next_page_props', next_page_props)
+    monkeypatch.setattr(zia, 'stream_next_data', stream_next_data)
+    zia._run_context["next_data"] = True
+    url = 'https://shop.test/products/tile'
+    incremental._incremental_context.update({
+        "enabled": enabled, "previous": {url: {"fingerprint": 'f', "ids": []}} if previous else {}})
+    asyncio.run(zia.process_link_url(url, 'Tile'))
+    assert calls == ([url] if asked else [])
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from src import main as zia
+
+
+def collection_page(positions, numbered=True) -> str:
+    tiles = ''.join(f'<div class="tile" data-position="{n if numbered else ""}">'
+                    f'<div><a href="/products/tile-{n}">Tile {n}</a></div></div>' for n in positions)
+    return f'<html><body><header><a href="/cart">Cart</a></header><main>{tiles}</main></body></html>'
+
+
+def test_only_the_tiles_after_the_last_position_are_read():
+    assert zia.new_tile_links(collection_page(range(1, 7)), 3) == (
+        ['/products/tile-4', '/products/tile-5', '/products/tile-6'], 6)
+
+
+def test_a_page_with_no_new_tiles_adds_nothing():
+    assert zia.new_tile_links(collection_page(range(1, 4)), 3) == ([], 3)
+
+
+def test_a_page_without_positions_is_read_whole():
+    links = ['/products/tile-1', '/products/tile-2']
+    assert zia.new_tile_links(collection_page([1, 2], numbered=False), 5) == (links, 5)